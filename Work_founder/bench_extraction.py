@@ -0,0 +1,99 @@
+import os
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+
+from playwright.async_api import async_playwright, Page
+
+import main
+
+FIXTURES = Path(__file__).parent / "fixtures"
+ROUNDS = 20
+
+
+async def legacy_listing(page: Page, parser: main.BaseParser) -> Tuple[List[Dict], Optional[str]]:
+    fields = parser.card_fields
+    cards = []
+    for v in await page.query_selector_all(parser.listing_selector):
+        title_el = await v.query_selector(fields["title"]) if fields["title"] else v
+        if not title_el:
+            continue
+        if fields["link"] == fields["title"]:
+            link_el = title_el
+        else:
+            link_el = await v.query_selector(fields["link"]) if fields["link"] else v
+        href = await link_el.get_attribute("href") if link_el else None
+        if not href:
+            continue
+        title = (await title_el.inner_text()).strip()
+
+        raw_date = ""
+        date_el = await v.query_selector(fields["date"]) if fields["date"] else None
+        if date_el:
+            if fields["date_attr"]:
+                raw_date = await date_el.get_attribute(fields["date_attr"]) or ""
+            else:
+                raw_date = (await date_el.inner_text()).strip()
+
+        cards.append(parser.card_from_record({"title": title, "href": href, "date": raw_date}, page.url))
+
+    next_url = None
+    next_btn = await page.query_selector("a[aria-label='Наступна сторінка']")
+    if next_btn:
+        next_href = await next_btn.get_attribute("href")
+        if next_href:
+            next_url = urljoin(page.url, next_href)
+    return cards, next_url
+
+
+async def legacy_detail(page: Page, parser: main.BaseParser, card: Dict) -> Dict:
+    await page.wait_for_selector(parser.detail_selector, timeout=parser.detail_timeout)
+    desc_el = await page.query_selector(parser.detail_selector)
+    desc = (await desc_el.inner_text()).strip() if desc_el else ""
+    date = None
+    if parser.detail_date_selector:
+        date_el = await page.wait_for_selector(parser.detail_date_selector, timeout=5000)
+        date = parser.format_date((await date_el.inner_text()).strip() if date_el else "")
+    return parser.make_job(card, desc, date)
+
+
+async def timed(make_call, rounds: int = ROUNDS):
+    result = await make_call()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await make_call()
+    return result, (time.perf_counter() - started) * 1000 / rounds
+
+
+async def bench():
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
+        print(f"{'источник':<12}{'этап':<10}{'карточек':>9}{'было, мс':>11}{'стало, мс':>11}{'ускорение':>11}")
+
+        for parser_cls in main.PARSERS:
+            parser = parser_cls(pool=None)
+            fixture_dir = FIXTURES / parser.name
+
+            await page.set_content((fixture_dir / "listing.html").read_text(encoding="utf-8"))
+            old, old_ms = await timed(lambda: legacy_listing(page, parser))
+            new, new_ms = await timed(lambda: parser.parse_listing(page))
+            assert old == new, f"{parser.name}: результаты извлечения списка различаются"
+            cards = new[0]
+            print(f"{parser.name:<12}{'список':<10}{len(cards):>9}{old_ms:>11.2f}{new_ms:>11.2f}{old_ms / new_ms:>10.1f}x")
+
+            await page.set_content((fixture_dir / "detail.html").read_text(encoding="utf-8"))
+            old, old_ms = await timed(lambda: legacy_detail(page, parser, cards[0]))
+            new, new_ms = await timed(lambda: parser.parse_detail(page, cards[0]))
+            assert old["description"] == new["description"], f"{parser.name}: описания различаются"
+            print(f"{parser.name:<12}{'вакансия':<10}{1:>9}{old_ms:>11.2f}{new_ms:>11.2f}{old_ms / new_ms:>10.1f}x")
+
+        await browser.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(bench())
@@ -0,0 +1,83 @@
+import os
+import sys
+import asyncio
+import random
+import tempfile
+import time
+from typing import List, Tuple
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+
+import main
+
+STORED = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+LOOKUPS = 2000
+INSERT_BATCH = 10_000
+
+
+def random_signature(rng: random.Random) -> Tuple[int, ...]:
+    return tuple(rng.randrange(main.MINHASH_PRIME) for _ in range(main.MINHASH_PERMUTATIONS))
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def populate(rng: random.Random) -> List[Tuple[int, ...]]:
+    samples = []
+    for start in range(0, STORED, INSERT_BATCH):
+        sigs, bands = [], []
+        for i in range(start, min(start + INSERT_BATCH, STORED)):
+            sig = random_signature(rng)
+            job_id = f"bench-{i}"
+            sigs.append((job_id, main.pack_signature(sig)))
+            bands.extend((bucket, job_id) for bucket in main.lsh_buckets(sig))
+            if len(samples) < LOOKUPS // 2:
+                samples.append(sig)
+        await main.db.executemany("INSERT INTO near_dup_sigs (job_id, sig) VALUES (?, ?)", sigs)
+        await main.db.executemany("INSERT INTO near_dup_bands (bucket, job_id) VALUES (?, ?)", bands)
+        await main.db.commit()
+    return samples
+
+
+async def bench():
+    main.DB_PATH = os.path.join(tempfile.mkdtemp(), "near_dup.db")
+    await main.init_db()
+    rng = random.Random(1)
+
+    started = time.perf_counter()
+    samples = await populate(rng)
+    print(f"записано сигнатур: {STORED} за {time.perf_counter() - started:.1f} с")
+
+    # половина запросов — слегка изменённые сохранённые сигнатуры, половина — новые
+    queries = []
+    for sig in samples:
+        noisy = list(sig)
+        for i in rng.sample(range(len(noisy)), 6):
+            noisy[i] = rng.randrange(main.MINHASH_PRIME)
+        queries.append((tuple(noisy), True))
+    queries += [(random_signature(rng), False) for _ in range(LOOKUPS - len(queries))]
+
+    timings, found, false_hits = [], 0, 0
+    for sig, is_dup in queries:
+        started = time.perf_counter()
+        match = await main.find_near_duplicate(sig)
+        timings.append((time.perf_counter() - started) * 1000)
+        found += bool(match) and is_dup
+        false_hits += bool(match) and not is_dup
+    print(f"поиск: p50 {percentile(timings, 0.5):.3f} мс, p99 {percentile(timings, 0.99):.3f} мс")
+    print(f"найдено дублей: {found}/{len(samples)}, ложных совпадений: {false_hits}")
+
+    text = " ".join(rng.choice(["python", "django", "досвід", "команда", "офіс", "віддалено", "api", "sql"])
+                    for _ in range(300))
+    started = time.perf_counter()
+    for _ in range(100):
+        main.minhash_signature(text)
+    print(f"сигнатура описания на 300 слов: {(time.perf_counter() - started) * 10:.2f} мс")
+
+    await main.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(bench())
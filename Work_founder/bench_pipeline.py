@@ -0,0 +1,166 @@
+import os
+import sys
+import asyncio
+import resource
+import tempfile
+import time
+from typing import Dict, List, Type
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+
+from aiohttp import web
+from aiogram.client.telegram import TelegramAPIServer
+from playwright.async_api import async_playwright, Error as PlaywrightError
+
+import main
+import fixture_server
+
+SUBSCRIBERS = 20
+HOST = "127.0.0.1"
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.sent = 0
+        self.last_sent = 0.0
+        self._runner = None
+        self.base = ""
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, HOST, 0).start()
+        self.base = f"http://{HOST}:{self._runner.addresses[0][1]}"
+        return self.base
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        self.sent += 1
+        self.last_sent = time.perf_counter()
+        message = {
+            "message_id": self.sent,
+            "date": int(time.time()),
+            "chat": {"id": int(form.get("chat_id", 0)), "type": "private"},
+            "text": form.get("text", ""),
+        }
+        return web.json_response({"ok": True, "result": message})
+
+
+class NoBrowserPool(main.BrowserPool):
+    async def start(self):
+        pass
+
+    async def health_check(self):
+        pass
+
+
+async def chromium_available() -> bool:
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            await browser.close()
+        return True
+    except PlaywrightError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def counter_total(name: str) -> float:
+    return sum(value for (counter, _), value in main.metrics.counters.items() if counter == name)
+
+
+async def pending_deliveries() -> int:
+    cur = await main.db.execute("SELECT COUNT(*) FROM deliveries WHERE status = 'pending'")
+    return (await cur.fetchone())[0]
+
+
+async def wait_until(predicate, poll: float = 0.05):
+    while not await predicate():
+        await asyncio.sleep(poll)
+
+
+async def bench(http_only: bool, polite: bool):
+    if not http_only and not await chromium_available():
+        print("Chromium недоступен — замеряем только источники с HTTP-путём.")
+        http_only = True
+    parsers: List[Type[main.BaseParser]] = [cls for cls in main.PARSERS if cls.http_fast_path or not http_only]
+    if http_only:
+        main.BrowserPool = NoBrowserPool
+    if not polite:
+        for parser_cls in parsers:
+            parser_cls.request_delay = 0
+
+    main.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    await main.init_db()
+    db_ops: Dict[str, int] = {}
+
+    def count_statement(sql: str):
+        if sql.startswith("--"):
+            return  # служебные запросы FTS5 и триггеров
+        kind = sql.lstrip().split(None, 1)[0].upper()
+        db_ops[kind] = db_ops.get(kind, 0) + 1
+
+    await main.db.set_trace_callback(count_statement)
+
+    sites = await fixture_server.start_sites(parsers, unique_details=True)
+    for site in sites.values():
+        site.parser_cls.start_url = site.start_url
+    telegram = FakeTelegram()
+    main.bot.session.api = TelegramAPIServer.from_base(await telegram.start())
+    main.broadcaster._bucket = main.TokenBucket(1_000_000, 1_000_000)
+    main.TELEGRAM_CHAT_INTERVAL = 0
+
+    for user_id in range(1, SUBSCRIBERS + 1):
+        await main.add_subscriber(user_id)
+    await main.broadcaster.load()
+    main.scheduler = main.Scheduler(parsers)
+    rss_before = peak_rss_mb()
+
+    started = time.perf_counter()
+    delivery_task = asyncio.create_task(main.delivery.run())
+    loop_task = asyncio.create_task(main.scrape_loop())
+
+    async def cycle_done() -> bool:
+        return all(state.next_run > 0 and not state.running for state in main.scheduler.sources)
+
+    async def deliveries_done() -> bool:
+        return await pending_deliveries() == 0
+
+    try:
+        await wait_until(cycle_done)
+        scraped = time.perf_counter() - started
+        await wait_until(deliveries_done)
+        delivered = telegram.last_sent - started
+    finally:
+        loop_task.cancel()
+        delivery_task.cancel()
+        await asyncio.gather(loop_task, delivery_task, return_exceptions=True)
+        await telegram.stop()
+        for site in sites.values():
+            await site.stop()
+        await main.bot.session.close()
+
+    jobs = counter_total("jobs")
+    new_jobs = counter_total("new_jobs")
+    print(f"источники: {', '.join(site.name for site in sites.values())}"
+          f"{'' if polite else ' (без задержки DETAILS_DELAY)'}")
+    print(f"цикл scrape_loop: {scraped:.2f} с, вакансий {jobs:g}, новых {new_jobs:g}, {jobs / scraped:.1f} вакансий/с")
+    print(f"доставка {telegram.sent} сообщений {SUBSCRIBERS} подписчикам завершена через {delivered:.2f} с "
+          f"({telegram.sent / delivered:.0f} сообщений/с)")
+    print(f"пиковый RSS: {peak_rss_mb():.0f} МБ (до цикла {rss_before:.0f} МБ)")
+    print("операции с БД: " + ", ".join(f"{kind} {count}" for kind, count in sorted(db_ops.items())))
+    print(f"этапы:\n{main.metrics.summary()}")
+    await main.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(bench("--http-only" in sys.argv, "--polite" in sys.argv))
@@ -0,0 +1,110 @@
+import os
+import sys
+import asyncio
+import random
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Type
+from urllib.parse import urlsplit
+
+os.environ.setdefault("BOT_TOKEN", "0:fixtures")
+
+from aiohttp import web
+
+import main
+
+FIXTURES = Path(__file__).parent / "fixtures"
+HOST = "127.0.0.1"
+
+
+class FixtureSite:
+    def __init__(self, parser_cls: Type[main.BaseParser], unique_details: bool = False):
+        self.parser_cls = parser_cls
+        self.unique_details = unique_details
+        self.name = parser_cls.name
+        self.start = urlsplit(parser_cls.start_url)
+        self.base = ""
+        self.requests = 0
+        self._runner = None
+        self._listing = (FIXTURES / self.name / "listing.html").read_text(encoding="utf-8")
+        self._detail = (FIXTURES / self.name / "detail.html").read_text(encoding="utf-8")
+        self._words = main.WORD_RE.findall(main.LexborHTMLParser(self._detail).css_first(parser_cls.detail_selector).text())
+
+    @property
+    def start_url(self) -> str:
+        return f"{self.base}{self.start.path}" + (f"?{self.start.query}" if self.start.query else "")
+
+    async def start_server(self, port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, HOST, port)
+        await site.start()
+        self.base = f"http://{HOST}:{self._runner.addresses[0][1]}"
+        origin = f"{self.start.scheme}://{self.start.netloc}"
+        self._listing = self._listing.replace(origin, self.base)
+        self._detail = self._detail.replace(origin, self.base)
+        return self.base
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        is_listing = request.path == self.start.path or "page=" in request.path_qs
+        if is_listing:
+            body = self._listing
+        elif self.unique_details:
+            body = self._unique_detail(request.path)
+        else:
+            body = self._detail
+        return web.Response(text=body, content_type="text/html", charset="utf-8")
+
+    def _unique_detail(self, path: str) -> str:
+        # у каждой вакансии свой абзац того же объёма, что и общий текст, — иначе их склеит дедупликация
+        rng = random.Random(path)
+        paragraph = " ".join(rng.choice(self._words) for _ in self._words)
+        return self._detail.replace("<p>Ми шукаємо", f"<p>{paragraph}</p><p>Ми шукаємо", 1)
+
+
+async def start_sites(parsers: List[Type[main.BaseParser]] = None,
+                      unique_details: bool = False) -> Dict[str, FixtureSite]:
+    sites = {}
+    for parser_cls in parsers or main.PARSERS:
+        site = FixtureSite(parser_cls, unique_details)
+        await site.start_server()
+        sites[site.name] = site
+    return sites
+
+
+async def check_http_parsers():
+    main.DB_PATH = os.path.join(tempfile.mkdtemp(), "fixtures.db")
+    await main.init_db()
+    sites = await start_sites([cls for cls in main.PARSERS if cls.http_fast_path])
+    http = main.HttpClient()
+    await http.start()
+    try:
+        for site in sites.values():
+            parser = site.parser_cls(pool=None, http=http, start_url=site.start_url)
+            jobs = await parser.run_http()
+            print(f"{site.name}: вакансий {len(jobs)}, запросов к серверу {site.requests}")
+            for job in jobs[:3]:
+                print(f"  {job['date']:<17} {job['title']} — {job['link']} ({len(job['description'])} симв.)")
+    finally:
+        await http.close()
+        for site in sites.values():
+            await site.stop()
+        await main.close_db()
+
+
+async def serve():
+    sites = await start_sites()
+    for site in sites.values():
+        print(f"{site.name}: {site.start_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(check_http_parsers() if "--check" in sys.argv else serve())
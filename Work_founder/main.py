@@ -1,19 +1,41 @@
 import os
 import asyncio
 import hashlib
+import html
+import json
+import random
+import re
+import struct
+from collections import deque
 import logging
+import time
+import math
+import multiprocessing
 from aiogram import loggers as aiogram_loggers
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Type
+from zoneinfo import ZoneInfo
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Dict, Type, Optional, Tuple, Iterable, Set, Callable, Awaitable, AsyncIterator
+from multiprocessing.connection import Connection
+from urllib.parse import urlsplit, urlunsplit, urljoin
+import aiohttp
+from aiohttp import web
 import aiosqlite
 from aiogram import Bot, Dispatcher, Router, exceptions
 from aiogram.enums import ParseMode
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.client.default import DefaultBotProperties
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright, Route, \
+    Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+from selectolax.lexbor import LexborHTMLParser, LexborNode
 from dotenv import load_dotenv
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
@@ -21,8 +43,64 @@ if not BOT_TOKEN:
 
 DB_PATH = "jobs.db"
 FETCH_INTERVAL = 15 * 60
+MIN_FETCH_INTERVAL = 5 * 60
+MAX_FETCH_INTERVAL = 2 * 60 * 60
+TARGET_NEW_PER_FETCH = 2
+RATE_WINDOW_HOURS = 48
+CRAWL_BUDGET_PER_HOUR = 60
 DETAILS_LIMIT = 20
 PAGES_LIMIT = 10
+BROWSER_RECYCLE_PAGES = 500
+CONTEXT_RECYCLE_PAGES = 100
+IDLE_PAGES_PER_SOURCE = 2
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+TRACKER_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "googleadservices.com",
+    "doubleclick.net", "adservice.google.com", "facebook.net", "connect.facebook.net", "hotjar.com",
+    "clarity.ms", "criteo.com", "criteo.net", "adnxs.com", "scorecardresearch.com", "gemius.pl",
+    "tiktok.com", "bat.bing.com", "smartlook.com", "onesignal.com", "mc.yandex.ru", "admixer.net",
+)
+BLOCKED_BYTES_ESTIMATE = {"image": 30_000, "media": 250_000, "font": 40_000, "script": 40_000}
+HTTP_CONNECTIONS = 20
+HTTP_CONNECTIONS_PER_HOST = 4
+HTTP_TIMEOUT = 30
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0 Safari/537.36",
+    "Accept-Language": "uk-UA,uk;q=0.9,en;q=0.8",
+}
+DETAILS_CONCURRENCY = 4
+PIPELINE_QUEUE_SIZE = 20
+PIPELINE_BATCH = 10
+DETAILS_DELAY = 0.5
+SOURCE_CONCURRENCY = 5
+CRAWL_SHARDS = int(os.getenv("CRAWL_SHARDS", "0"))
+SHARD_CHECK_INTERVAL = 30
+SOURCE_TIME_BUDGET = 5 * 60
+TELEGRAM_RATE = 25
+TELEGRAM_CHAT_INTERVAL = 1.0
+SEND_RETRIES = 3
+DELIVERY_WORKERS = 20
+DELIVERY_BATCH = 200
+DELIVERY_POLL_INTERVAL = 30
+DELIVERY_FLUSH_INTERVAL = 1.0
+DELIVERY_MAX_ATTEMPTS = 8
+DELIVERY_RETRY_DELAY = 60
+DELIVERY_MAX_RETRY_DELAY = 60 * 60
+DIGEST_MODES = ("instant", "hourly", "daily")
+DIGEST_HOUR = 9
+DIGEST_CHECK_INTERVAL = 60
+TELEGRAM_MESSAGE_LIMIT = 4096
+INCREMENTAL_CRAWL = True
+KNOWN_STREAK_LIMIT = 5
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH")
+SNAPSHOT_MAX_BYTES = 256 * 1024 * 1024
+SNAPSHOT_ZSTD_LEVEL = 3
+BREAKER_THRESHOLD = 5
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BREAKER_COOLDOWN = 15 * 60
+BREAKER_MAX_COOLDOWN = 4 * 60 * 60
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 logger = logging.getLogger("jobs-bot")
@@ -87,550 +165,2138 @@ class ColorLanguageLogger:
         logger.addHandler(handler)
         logger.setLevel(logging.INFO)
 
+# ================= МЕТРИКИ =================
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(METRICS_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(METRICS_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+class Metrics:
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.stages: Dict[Tuple[str, str], Histogram] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, stage: str, source: str, seconds: float):
+        self.stages.setdefault((stage, source), Histogram()).observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str, source: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, source, time.perf_counter() - started)
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE jobs_bot_{name}_total counter")
+            for (counter, labels), value in sorted(self.counters.items()):
+                if counter == name:
+                    lines.append(f"jobs_bot_{name}_total{format_labels(labels)} {value:g}")
+        lines.append("# TYPE jobs_bot_stage_seconds histogram")
+        for (stage, source), hist in sorted(self.stages.items()):
+            labels = (("source", source), ("stage", stage))
+            cumulative = 0
+            for bound, count in zip(METRICS_BUCKETS, hist.counts):
+                cumulative += count
+                lines.append(f"jobs_bot_stage_seconds_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"jobs_bot_stage_seconds_bucket{format_labels(labels + (('le', '+Inf'),))} {hist.count}")
+            lines.append(f"jobs_bot_stage_seconds_sum{format_labels(labels)} {hist.sum:.6f}")
+            lines.append(f"jobs_bot_stage_seconds_count{format_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        totals: Dict[str, float] = {}
+        for (name, _), value in self.counters.items():
+            totals[name] = totals.get(name, 0) + value
+        stages: Dict[str, List[float]] = {}
+        for (stage, _), hist in self.stages.items():
+            total = stages.setdefault(stage, [0, 0.0])
+            total[0] += hist.count
+            total[1] += hist.sum
+        lines = [", ".join(f"{name}: {value:g}" for name, value in sorted(totals.items()))]
+        for stage, (count, seconds) in sorted(stages.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{stage}: {count} шт., всего {seconds:.1f} с, в среднем {seconds / count * 1000:.0f} мс")
+        return "\n".join(line for line in lines if line)
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+metrics = Metrics()
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+async def start_metrics_server() -> Optional[web.AppRunner]:
+    if not METRICS_PORT:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        # метрики вспомогательные: занятый порт не должен мешать запуску бота
+        logger.warning(f"Не удалось открыть порт метрик {METRICS_HOST}:{METRICS_PORT}: {e}")
+        await runner.cleanup()
+        return None
+    logger.info(f"Метрики доступны на http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
+
+# ================= ДАТЫ =================
+UKR_MONTHS = {
+    "січня": "01", "лютого": "02", "березня": "03", "квітня": "04",
+    "травня": "05", "червня": "06", "липня": "07", "серпня": "08",
+    "вересня": "09", "жовтня": "10", "листопада": "11", "грудня": "12"
+}
+DAY = 86400
+# порядок важен: русское "года" раньше украинского "год" (годин)
+DATE_UNITS = (
+    ("хв", 60), ("мин", 60), ("года", 365 * DAY), ("год", 3600), ("час", 3600),
+    ("дн", DAY), ("ден", DAY), ("доб", DAY), ("тиж", 7 * DAY), ("нед", 7 * DAY),
+    ("міс", 30 * DAY), ("мес", 30 * DAY), ("рік", 365 * DAY), ("рок", 365 * DAY), ("лет", 365 * DAY),
+)
+# время бывает и после даты ("18.10.2026 09:00"), и перед ней, как у djinni ("09:00 18.10.2026")
+NUMERIC_DATE_RE = re.compile(
+    r"(?:(\d{1,2}):(\d{2})\D{1,3})?(\d{1,2})\.(\d{1,2})\.(\d{4})(?:\D{1,3}(\d{1,2}):(\d{2}))?"
+)
+ISO_DATE_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})(?:[T ](\d{1,2}):(\d{2}))?")
+TIME_RE = re.compile(r"(\d{1,2}):(\d{2})")
+DAY_MONTH_RE = re.compile(r"(\d{1,2})\s+([^\W\d]+)(?:\s+(\d{4}))?")
+RELATIVE_RE = re.compile(r"(\d+)\s*([^\W\d]+)")
+
+def assume_year(day: int, month: int, now: datetime) -> int:
+    # "5 грудня" в январе — это прошлый год
+    return now.year - 1 if (month, day) > (now.month, now.day) else now.year
+
+def parse_posted(text: str, now: datetime = None) -> Optional[int]:
+    if not text:
+        return None
+    now = now or datetime.now(SOURCE_TZ)
+    text = text.lower()
+    posted = None
+    try:
+        numeric, iso = NUMERIC_DATE_RE.search(text), None
+        if not numeric:
+            iso = ISO_DATE_RE.search(text)
+        if numeric or iso:
+            if numeric:
+                hour_before, minute_before, day, month, year, hour, minute = numeric.groups()
+                hour, minute = hour or hour_before, minute or minute_before
+            else:
+                year, month, day, hour, minute = iso.groups()
+            posted = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), tzinfo=SOURCE_TZ)
+        elif any(word in text for word in ("сьогодні", "сегодня", "вчора", "вчера")):
+            time_match = TIME_RE.search(text)
+            hour, minute = (int(time_match[1]), int(time_match[2])) if time_match else (0, 0)
+            posted = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if "вчора" in text or "вчера" in text:
+                posted -= timedelta(days=1)
+        else:
+            match = DAY_MONTH_RE.search(text)
+            if match and match[2] in UKR_MONTHS:
+                day, month = int(match[1]), int(UKR_MONTHS[match[2]])
+                year = int(match[3]) if match[3] else assume_year(day, month, now)
+                posted = datetime(year, month, day, tzinfo=SOURCE_TZ)
+            else:
+                for count, word in RELATIVE_RE.findall(text):
+                    seconds = next((unit for prefix, unit in DATE_UNITS if word.startswith(prefix)), None)
+                    if seconds:
+                        posted = now - timedelta(seconds=int(count) * seconds)
+                        break
+    except ValueError:
+        return None
+    if posted is None:
+        return None
+    return int(min(posted, now).timestamp())
+
+def format_posted(posted: int) -> str:
+    return datetime.fromtimestamp(posted, SOURCE_TZ).strftime("%d.%m.%Y %H:%M")
+
 # ================= ДАННЫЕ =================
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA busy_timeout=5000",
+)
+SQL_BATCH = 500
+NEAR_DUP_THRESHOLD = 0.8
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+NEAR_DUP_MIN_SHINGLES = 10
+BLOOM_CAPACITY = 400_000
+BLOOM_ERROR_RATE = 0.01
+# самые старые вакансии в выдаче — у work.ua (days= в start_url); хранить нужно дольше, иначе
+# удалённая, но всё ещё опубликованная вакансия снова придёт как новая
+LISTING_MAX_AGE_DAYS = 122
+RETENTION_DAYS = LISTING_MAX_AGE_DAYS + 60
+PRUNE_INTERVAL = 24 * 60 * 60
+SEARCH_PAGE_SIZE = 5
+LATEST_MAX = 20
+SOURCE_TZ = ZoneInfo("Europe/Kyiv")
+SEARCH_MAX_TERMS = 8
+SEARCH_CANDIDATES = 2000
+
+db: Optional[aiosqlite.Connection] = None
+seen_filter: Optional["BloomFilter"] = None
+# сохранять фильтр может только единственный пишущий процесс, иначе в нём не будет чужих вставок
+seen_filter_persist = True
+db_lock = asyncio.Lock()
+
 def make_job_id(source: str, description: str) -> str:
     normalized_desc = " ".join(description.lower().strip().split())
     return hashlib.sha256(f"{source}|{normalized_desc}".encode()).hexdigest()
 
+def canonical_link(url: str) -> str:
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, "", ""))
+
+def chunked(items: List, size: int = SQL_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE, bits: bytes = None, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits else bytearray((self.size + 7) // 8)
+        self.count = count
+        self.checks = 0
+        self.misses = 0
+
+    def _positions(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, keys: Iterable[str]):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        self.checks += 1
+        found = all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+        if not found:
+            self.misses += 1
+        return found
+
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+def seen_keys(job_id: str, link: str) -> Tuple[str, str]:
+    return f"id:{job_id}", f"link:{link}"
+
+async def rebuild_seen_filter():
+    global seen_filter
+    async with db.execute("SELECT id, link FROM seen_jobs") as cur:
+        rows = await cur.fetchall()
+    cur = await db.execute("SELECT COALESCE(MAX(rowid), 0) FROM seen_jobs")
+    last_rowid = (await cur.fetchone())[0]
+    bloom = BloomFilter(max(BLOOM_CAPACITY, len(rows) * 4))
+    await asyncio.to_thread(bloom.update, (key for row in rows for key in seen_keys(*row)))
+    seen_filter = bloom
+    await save_seen_filter(last_rowid)
+    logger.info(f"Фильтр Блума пересобран: вакансий {len(rows)}, {len(bloom.bits) / 1024:.0f} КБ")
+
+async def save_seen_filter(last_rowid: int = None):
+    if not seen_filter_persist:
+        return
+    if last_rowid is None:
+        cur = await db.execute("SELECT COALESCE(MAX(rowid), 0) FROM seen_jobs")
+        last_rowid = (await cur.fetchone())[0]
+    await db.execute(
+        """INSERT OR REPLACE INTO bloom_state (name, capacity, error_rate, count, last_rowid, bits)
+           VALUES ('seen_jobs', ?, ?, ?, ?, ?)""",
+        (seen_filter.capacity, seen_filter.error_rate, seen_filter.count, last_rowid, bytes(seen_filter.bits))
+    )
+    await db.commit()
+
+async def load_seen_filter():
+    global seen_filter
+    cur = await db.execute(
+        "SELECT capacity, error_rate, count, last_rowid, bits FROM bloom_state WHERE name = 'seen_jobs'"
+    )
+    row = await cur.fetchone()
+    if not row or row[1] != BLOOM_ERROR_RATE or row[2] > row[0]:
+        await rebuild_seen_filter()
+        return
+    capacity, error_rate, count, last_rowid, bits = row
+    seen_filter = BloomFilter(capacity, error_rate, bits, count)
+    # строки, добавленные после последнего сохранения (например, при аварийной остановке)
+    async with db.execute("SELECT id, link FROM seen_jobs WHERE rowid > ?", (last_rowid,)) as cur:
+        async for job_id, link in cur:
+            seen_filter.update(seen_keys(job_id, link))
+    if seen_filter.count > seen_filter.capacity:
+        await rebuild_seen_filter()
+
+async def add_column(table: str, column: str, definition: str) -> bool:
+    async with db.execute(f"PRAGMA table_info({table})") as cur:
+        if column in [row[1] async for row in cur]:
+            return False
+    await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+async def backfill_posted():
+    # дата публикации старых вакансий есть только в jobs_fts, относительные даты считаем от first_seen
+    async with db.execute(
+        "SELECT s.rowid, f.date, s.first_seen FROM seen_jobs s LEFT JOIN jobs_fts f ON f.rowid = s.rowid"
+    ) as cur:
+        rows = await cur.fetchall()
+    updates = []
+    for rowid, date, first_seen in rows:
+        seen = datetime.fromisoformat(first_seen).astimezone(SOURCE_TZ)
+        updates.append((parse_posted(date, seen) or int(seen.timestamp()), rowid))
+    await db.executemany("UPDATE seen_jobs SET posted = ? WHERE rowid = ?", updates)
+    logger.info(f"Заполнены даты публикации для {len(updates)} вакансий.")
+
 async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""CREATE TABLE IF NOT EXISTS subscribers(
-                user_id INTEGER PRIMARY KEY
-        )""")
-        await db.execute("""CREATE TABLE IF NOT EXISTS seen_jobs(
-                id TEXT PRIMARY KEY,
-                source TEXT,
-                link TEXT,
-                title TEXT,
-                first_seen TEXT
-        )""")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_seen_first_seen ON seen_jobs(first_seen)")
+    global db
+    if db is not None:
+        return
+    db = await aiosqlite.connect(DB_PATH)
+    for pragma in DB_PRAGMAS:
+        await db.execute(pragma)
+    cur = await db.execute("PRAGMA auto_vacuum")
+    if (await cur.fetchone())[0] != 2:
+        # режим auto_vacuum меняется только вместе с полным VACUUM — один раз для старых баз
+        await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await db.execute("VACUUM")
+    await db.execute("""CREATE TABLE IF NOT EXISTS subscribers(
+            user_id INTEGER PRIMARY KEY,
+            digest TEXT NOT NULL DEFAULT 'instant',
+            digest_due INTEGER NOT NULL DEFAULT 0
+    )""")
+    await add_column("subscribers", "digest", "TEXT NOT NULL DEFAULT 'instant'")
+    await add_column("subscribers", "digest_due", "INTEGER NOT NULL DEFAULT 0")
+    await db.execute("""CREATE TABLE IF NOT EXISTS seen_jobs(
+            id TEXT PRIMARY KEY,
+            source TEXT,
+            link TEXT,
+            title TEXT,
+            first_seen TEXT,
+            posted INTEGER
+    )""")
+    posted_added = await add_column("seen_jobs", "posted", "INTEGER")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_seen_first_seen ON seen_jobs(first_seen)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_seen_source_first_seen ON seen_jobs(source, first_seen)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_seen_posted ON seen_jobs(posted)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_seen_link ON seen_jobs(link)")
+    await db.execute("""CREATE TABLE IF NOT EXISTS crawl_state(
+            source TEXT PRIMARY KEY,
+            newest_link TEXT,
+            updated TEXT
+    )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS outbox(
+            job_id TEXT PRIMARY KEY,
+            payload TEXT,
+            created TEXT
+    )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS deliveries(
+            job_id TEXT,
+            user_id INTEGER,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            updated TEXT,
+            posted INTEGER NOT NULL DEFAULT 0,
+            retry_at INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (job_id, user_id)
+    )""")
+    await add_column("deliveries", "posted", "INTEGER NOT NULL DEFAULT 0")
+    await add_column("deliveries", "retry_at", "INTEGER NOT NULL DEFAULT 0")
+    # очередь рассылки читается по дате публикации, индекс по одному статусу больше не нужен
+    await db.execute("DROP INDEX IF EXISTS idx_deliveries_status")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_deliveries_pending ON deliveries(status, posted)")
+    # вакансии для дайджестов копятся со статусом 'digest' и не попадают в очередь мгновенной рассылки
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_deliveries_digest ON deliveries(user_id, posted) WHERE status = 'digest'"
+    )
+    await db.execute("""CREATE TABLE IF NOT EXISTS http_cache(
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body_hash TEXT,
+            size INTEGER,
+            updated TEXT
+    )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS near_dup_sigs(
+            job_id TEXT PRIMARY KEY,
+            sig BLOB,
+            original TEXT
+    )""")
+    # у подавленной копии original — вакансия, которую рассылали, а не копия, с которой она совпала
+    await add_column("near_dup_sigs", "original", "TEXT")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_near_dup_original ON near_dup_sigs(original)")
+    await db.execute("""CREATE TABLE IF NOT EXISTS near_dup_bands(
+            bucket INTEGER,
+            job_id TEXT,
+            PRIMARY KEY (bucket, job_id)
+    ) WITHOUT ROWID""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS filters(
+            user_id INTEGER,
+            kind TEXT,
+            value TEXT,
+            PRIMARY KEY (user_id, kind, value)
+    )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS bloom_state(
+            name TEXT PRIMARY KEY,
+            capacity INTEGER,
+            error_rate REAL,
+            count INTEGER,
+            last_rowid INTEGER,
+            bits BLOB
+    )""")
+    cur = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'jobs_fts'")
+    fts_exists = await cur.fetchone()
+    await db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+            title,
+            description,
+            date UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+    )""")
+    await db.execute("""CREATE TRIGGER IF NOT EXISTS seen_jobs_fts_delete AFTER DELETE ON seen_jobs BEGIN
+            DELETE FROM jobs_fts WHERE rowid = old.rowid;
+    END""")
+    if not fts_exists:
+        # описания раньше не сохранялись — старые вакансии ищутся хотя бы по названию
+        await db.execute("INSERT INTO jobs_fts (rowid, title, description, date) SELECT rowid, title, '', '' FROM seen_jobs")
+    if posted_added:
+        await backfill_posted()
+    await db.commit()
+    await load_seen_filter()
+
+async def close_db():
+    global db
+    if db is not None:
+        if seen_filter is not None:
+            async with db_lock:
+                await save_seen_filter()
+        await db.close()
+        db = None
+
+async def enqueue_new_jobs(jobs: List[Dict]) -> List[Dict]:
+    by_id: Dict[str, Dict] = {}
+    for job in jobs:
+        # id строится по описанию: у пустого он общий для всего источника, и вакансии перезаписали бы ссылки друг друга
+        if job["description"]:
+            by_id.setdefault(make_job_id(job["source"], job["description"]), job)
+    if not by_id:
+        return []
+
+    now_dt = datetime.now(timezone.utc)
+    now = now_dt.isoformat()
+    for job in by_id.values():
+        job["posted"] = job.get("posted") or int(now_dt.timestamp())
+    async with db_lock:
+        stored: Dict[str, str] = {}
+        for chunk in chunked([jid for jid in by_id if f"id:{jid}" in seen_filter]):
+            placeholders = ",".join("?" * len(chunk))
+            async with db.execute(f"SELECT id, link FROM seen_jobs WHERE id IN ({placeholders})", chunk) as cur:
+                stored.update({row[0]: row[1] async for row in cur})
+
+        new_ids = [jid for jid in by_id if jid not in stored]
+        signatures = await asyncio.to_thread(minhash_signatures, [by_id[jid]["description"] for jid in new_ids])
+        rejections = dict(zip(new_ids, await asyncio.to_thread(
+            subscriber_filters.rejections, [by_id[jid] for jid in new_ids]
+        )))
+
+        # при сборе в нескольких процессах отложенная транзакция получила бы SQLITE_BUSY при первой записи
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            duplicates: Dict[str, Tuple[str, float]] = {}
+            for jid, sig in zip(new_ids, signatures):
+                if sig is None:
+                    continue
+                match = await find_near_duplicate(sig)
+                if match:
+                    duplicates[jid] = match
+                await store_signature(jid, sig, match[0] if match else None)
+            # рассылка идёт в порядке публикации, а не в порядке обхода страниц
+            fresh_ids = sorted((jid for jid in new_ids if jid not in duplicates), key=lambda jid: by_id[jid]["posted"])
+            filtered = [(jid, rejections[jid]) for jid in fresh_ids if rejections[jid]]
+
+            relinked = []
+            for jid, link in stored.items():
+                link_now = canonical_link(by_id[jid]["link"])
+                if link != link_now:
+                    relinked.append((link_now, jid))
+
+            await db.executemany(
+                "INSERT INTO seen_jobs (id, source, link, title, first_seen, posted) VALUES (?, ?, ?, ?, ?, ?)",
+                [(jid, by_id[jid]["source"], canonical_link(by_id[jid]["link"]), by_id[jid]["title"][:100], now,
+                  by_id[jid]["posted"]) for jid in new_ids]
+            )
+            await db.executemany(
+                "INSERT INTO jobs_fts (rowid, title, description, date) SELECT rowid, ?, ?, ? FROM seen_jobs WHERE id = ?",
+                [(by_id[jid]["title"], by_id[jid]["description"], by_id[jid]["date"], jid) for jid in new_ids]
+            )
+            await db.executemany("UPDATE seen_jobs SET link = ? WHERE id = ?", relinked)
+            seen_filter.update(key for jid in new_ids for key in seen_keys(jid, canonical_link(by_id[jid]["link"])))
+            seen_filter.update(f"link:{link}" for link, _ in relinked)
+            await db.executemany(
+                "INSERT INTO outbox (job_id, payload, created) VALUES (?, ?, ?)",
+                [(jid, json.dumps(by_id[jid], ensure_ascii=False), now) for jid in fresh_ids]
+            )
+            await db.executemany(
+                "INSERT INTO deliveries (job_id, user_id, updated, posted, status) "
+                "SELECT ?, user_id, ?, ?, CASE digest WHEN 'instant' THEN 'pending' ELSE 'digest' END FROM subscribers",
+                [(jid, now, by_id[jid]["posted"]) for jid in fresh_ids if not rejections[jid]]
+            )
+            if filtered:
+                cur = await db.execute("SELECT user_id, digest FROM subscribers")
+                statuses = {row[0]: "pending" if row[1] == "instant" else "digest" for row in await cur.fetchall()}
+                await db.executemany(
+                    "INSERT INTO deliveries (job_id, user_id, updated, posted, status) VALUES (?, ?, ?, ?, ?)",
+                    [(jid, user_id, now, by_id[jid]["posted"], status)
+                     for jid, rejected in filtered for user_id, status in statuses.items() if user_id not in rejected]
+                )
+            # копию подавляем только для тех, кому доставлялся оригинал, — остальным его не пропустили фильтры
+            reposts: Dict[str, List[Tuple[int, str]]] = {}
+            for jid, (original, _) in duplicates.items():
+                cur = await db.execute(
+                    "SELECT user_id, digest FROM subscribers "
+                    "WHERE user_id NOT IN (SELECT user_id FROM deliveries WHERE job_id = ? "
+                    "OR job_id IN (SELECT job_id FROM near_dup_sigs WHERE original = ?))", (original, original)
+                )
+                users = [(user_id, "pending" if digest == "instant" else "digest")
+                         for user_id, digest in await cur.fetchall() if user_id not in rejections[jid]]
+                if users:
+                    reposts[jid] = users
+            await db.executemany(
+                "INSERT INTO outbox (job_id, payload, created) VALUES (?, ?, ?)",
+                [(jid, json.dumps(by_id[jid], ensure_ascii=False), now) for jid in reposts]
+            )
+            await db.executemany(
+                "INSERT INTO deliveries (job_id, user_id, updated, posted, status) VALUES (?, ?, ?, ?, ?)",
+                [(jid, user_id, now, by_id[jid]["posted"], status)
+                 for jid, users in reposts.items() for user_id, status in users]
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+    for jid, (original, similarity) in duplicates.items():
+        if jid in reposts:
+            logger.info(f"Похожая вакансия уже отправлялась ({similarity:.0%}), отправляем только "
+                        f"{len(reposts[jid])} подписчикам без оригинала: {by_id[jid]['title'][:50]} ({by_id[jid]['source']})")
+        else:
+            logger.info(f"Похожая вакансия уже отправлялась ({similarity:.0%}), пропускаем: "
+                        f"{by_id[jid]['title'][:50]} ({by_id[jid]['source']})")
+    for jid in fresh_ids:
+        logger.info(f"Добавлена новая вакансия: {by_id[jid]['title'][:50]}...")
+    return [by_id[jid] for jid in fresh_ids] + [by_id[jid] for jid in reposts]
+
+async def known_links(links: Iterable[str]) -> Set[str]:
+    known = set()
+    candidates = {canonical_link(link) for link in links}
+    for chunk in chunked([link for link in candidates if f"link:{link}" in seen_filter]):
+        placeholders = ",".join("?" * len(chunk))
+        async with db.execute(f"SELECT link FROM seen_jobs WHERE link IN ({placeholders})", chunk) as cur:
+            known.update([row[0] async for row in cur])
+    return known
+
+async def prune_old_jobs(days: int = RETENTION_DAYS) -> int:
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    removed = 0
+    while True:
+        async with db_lock:
+            async with db.execute("SELECT id FROM seen_jobs WHERE first_seen < ? LIMIT ?", (cutoff, SQL_BATCH)) as cur:
+                ids = [row[0] async for row in cur]
+            if not ids:
+                break
+            placeholders = ",".join("?" * len(ids))
+            async with db.execute(f"SELECT job_id, sig FROM near_dup_sigs WHERE job_id IN ({placeholders})", ids) as cur:
+                bands = [(bucket, job_id) async for job_id, blob in cur for bucket in lsh_buckets(unpack_signature(blob))]
+            await db.executemany("DELETE FROM near_dup_bands WHERE bucket = ? AND job_id = ?", bands)
+            for table, column in (("near_dup_sigs", "job_id"), ("deliveries", "job_id"), ("outbox", "job_id"),
+                                  ("seen_jobs", "id")):
+                await db.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", ids)
+            await db.commit()
+        removed += len(ids)
+
+    async with db_lock:
+        if removed:
+            await rebuild_seen_filter()
+        # через execute() прагма освобождает лишь одну страницу, executescript() выполняет её до конца
+        await db.executescript("PRAGMA incremental_vacuum;")
+    return removed
+
+def fts_query(text: str) -> str:
+    terms = WORD_RE.findall(text.lower())[:SEARCH_MAX_TERMS]
+    return " ".join(f'"{term}"' for term in terms)
+
+async def count_matches(match: str) -> int:
+    cur = await db.execute("SELECT COUNT(*) FROM jobs_fts WHERE jobs_fts MATCH ?", (match,))
+    return (await cur.fetchone())[0]
+
+async def search_jobs(query: str, offset: int = 0, limit: int = SEARCH_PAGE_SIZE) -> Tuple[List[Dict], int]:
+    # возвращает результаты и число совпадений; BM25 по всем совпадениям дорог только для частых слов,
+    # поэтому при большом числе совпадений ранжируются лишь самые свежие SEARCH_CANDIDATES
+    match = fts_query(query)
+    if not match:
+        return [], 0
+    total = await count_matches(match)
+    if not total:
+        return [], 0
+    capped = total > SEARCH_CANDIDATES
+    window = """ AND f.rowid >= (
+               SELECT COALESCE(MIN(rowid), 0) FROM (
+                   SELECT rowid FROM jobs_fts WHERE jobs_fts MATCH ? ORDER BY rowid DESC LIMIT ?
+               )
+           )""" if capped else ""
+    async with db.execute(
+        f"""SELECT s.source, s.link, f.title, f.date, s.first_seen,
+                  snippet(jobs_fts, 1, char(2), char(3), '…', 16)
+           FROM jobs_fts f JOIN seen_jobs s ON s.rowid = f.rowid
+           WHERE jobs_fts MATCH ?{window}
+           ORDER BY bm25(jobs_fts, 5.0, 1.0)
+           LIMIT ? OFFSET ?""",
+        (match, match, SEARCH_CANDIDATES, limit, offset) if capped else (match, limit, offset)
+    ) as cur:
+        jobs = [
+            {"source": row[0], "link": row[1], "title": row[2], "date": row[3] or row[4][:10], "snippet": row[5]}
+            async for row in cur
+        ]
+    return jobs, total
+
+async def latest_jobs(limit: int, since: int = 0) -> List[Dict]:
+    async with db.execute(
+        "SELECT source, link, title, posted FROM seen_jobs WHERE posted >= ? ORDER BY posted DESC LIMIT ?",
+        (since, limit)
+    ) as cur:
+        return [{"source": row[0], "link": row[1], "title": row[2], "posted": row[3]} async for row in cur]
+
+async def count_jobs_since(since: int) -> int:
+    cur = await db.execute("SELECT COUNT(*) FROM seen_jobs WHERE posted >= ?", (since,))
+    return (await cur.fetchone())[0]
+
+async def get_newest_link(source: str) -> Optional[str]:
+    cur = await db.execute("SELECT newest_link FROM crawl_state WHERE source = ?", (source,))
+    row = await cur.fetchone()
+    return row[0] if row else None
+
+async def save_newest_link(source: str, link: str):
+    async with db_lock:
+        await db.execute(
+            "INSERT OR REPLACE INTO crawl_state (source, newest_link, updated) VALUES (?, ?, ?)",
+            (source, link, datetime.now(timezone.utc).isoformat())
+        )
         await db.commit()
 
-async def job_seen(source: str, description: str, title: str) -> bool:
-    jid = make_job_id(source, description)
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT 1 FROM seen_jobs WHERE id = ?", (jid,))
-        if await cur.fetchone():
-            return True
-        await db.execute(
-            "INSERT INTO seen_jobs (id, source, link, title, first_seen) VALUES (?, ?, ?, ?, ?)",
-            (jid, source, "", title[:100], datetime.now(timezone.utc).isoformat())
+async def get_http_cache(url: str) -> Optional[Tuple[str, str, str, int]]:
+    cur = await db.execute("SELECT etag, last_modified, body_hash, size FROM http_cache WHERE url = ?", (url,))
+    row = await cur.fetchone()
+    return tuple(row) if row else None
+
+async def save_http_cache(entries: List[Tuple[str, str, str, str, int]]):
+    if not entries:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    async with db_lock:
+        await db.executemany(
+            "INSERT OR REPLACE INTO http_cache (url, etag, last_modified, body_hash, size, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [entry + (now,) for entry in entries]
         )
         await db.commit()
-        logger.info(f"Добавлена новая вакансия: {title[:50]}...")
-        return False
+
+async def new_jobs_per_hour(source: str, hours: float = RATE_WINDOW_HOURS) -> Optional[float]:
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+    cur = await db.execute("SELECT MIN(first_seen) FROM seen_jobs WHERE source = ?", (source,))
+    oldest = (await cur.fetchone())[0]
+    if not oldest or oldest > since:
+        # истории меньше окна: первый обход видит весь накопленный список, по нему темп не оценить
+        return None
+    cur = await db.execute("SELECT COUNT(*) FROM seen_jobs WHERE source = ? AND first_seen >= ?", (source, since))
+    return (await cur.fetchone())[0] / hours
 
 async def get_subscribers() -> List[int]:
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT user_id FROM subscribers") as cur:
-            subscribers = [row[0] async for row in cur]
+    async with db.execute("SELECT user_id FROM subscribers") as cur:
+        subscribers = [row[0] async for row in cur]
     return subscribers
 
+async def add_subscriber(user_id: int):
+    async with db_lock:
+        await db.execute("INSERT OR IGNORE INTO subscribers (user_id) VALUES (?)", (user_id,))
+        await db.commit()
 
-# ================= ПОИСК =================
-class WorkUA:
-    name = "work.ua"
-    start_url = "https://www.work.ua/jobs-it-industry-it/?advs=1&sort=date&days=122&language=1+41&language_level=1-83+1-84+41-22836"
-
-    async def run(self) -> List[Dict]:
-        logger.info(f"Начинается парсинг сайта: {self.name}")
-        jobs = []
-        url = self.start_url
-
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+async def remove_subscriber(user_id: int):
+    async with db_lock:
+        await db.execute("DELETE FROM subscribers WHERE user_id = ?", (user_id,))
+        await db.execute(
+            "UPDATE deliveries SET status = 'dropped' WHERE user_id = ? AND status IN ('pending', 'digest')",
+            (user_id,)
+        )
+        await db.commit()
 
-            for _ in range(PAGES_LIMIT):
-                await page.goto(url, wait_until="domcontentloaded")
+async def get_digest(user_id: int) -> Optional[str]:
+    cur = await db.execute("SELECT digest FROM subscribers WHERE user_id = ?", (user_id,))
+    row = await cur.fetchone()
+    return row[0] if row else None
+
+async def set_digest(user_id: int, mode: str, due: int):
+    async with db_lock:
+        await db.execute("UPDATE subscribers SET digest = ?, digest_due = ? WHERE user_id = ?", (mode, due, user_id))
+        if mode == "instant":
+            await db.execute("UPDATE deliveries SET status = 'pending' WHERE user_id = ? AND status = 'digest'", (user_id,))
+        else:
+            await db.execute("UPDATE deliveries SET status = 'digest' WHERE user_id = ? AND status = 'pending'", (user_id,))
+        await db.commit()
 
-                try:
-                    await page.wait_for_selector("div.card.card-hover.card-visited.wordwrap.job-link", timeout=8000)
-                except PlaywrightTimeoutError:
-                    logger.warning("Путь к вакансиям на странице не найден или страница не загрузилась.")
-                    break
-
-                vacancies = await page.query_selector_all("div.card.card-hover.card-visited.wordwrap.job-link")
-
-                for v in vacancies:
-                    title_link = await v.query_selector("h2.my-0 a")
-                    if not title_link:
-                        continue
-
-                    href = await title_link.get_attribute("href")
-                    if not href:
-                        continue
-                    if href.startswith("/"):
-                        href = "https://www.work.ua" + href
-
-                    title = (await title_link.inner_text()).strip()
-
-                    date_el = await v.query_selector("div.flex.flex-align-center.flex-wrap time")
-                    date = ""
-                    if date_el:
-                        datetime_attr = await date_el.get_attribute("datetime")
-                        if datetime_attr:
-                            dt = datetime.strptime(datetime_attr, "%Y-%m-%d %H:%M:%S")
-                            date = dt.strftime("%d.%m.%Y %H:%M")
-
-                    job_page = await browser.new_page()
-                    await job_page.goto(href, wait_until="domcontentloaded")
-                    try:
-                        await job_page.wait_for_selector("div#job-description", timeout=5000)
-                    except PlaywrightTimeoutError:
-                        logger.warning(f"Описание вакансии не найдено: {href}")
-                        pass
-                    desc_el = await job_page.query_selector("div#job-description")
-                    desc = (await desc_el.inner_text()).strip() if desc_el else ""
-                    await job_page.close()
-
-                    jobs.append({
-                        "title": title,
-                        "link": href,
-                        "description": desc,
-                        "source": self.name,
-                        "date": date if date else ""
-                    })
-
-                    if len(jobs) >= DETAILS_LIMIT:
-                        logger.info(f"Достигнут лимит вакансий, прекращаем сбор.")
-                        break
+async def due_digests(now: int) -> List[Tuple[int, str]]:
+    async with db.execute(
+        "SELECT user_id, digest FROM subscribers WHERE digest != 'instant' AND digest_due <= ?", (now,)
+    ) as cur:
+        return [tuple(row) async for row in cur]
+
+async def claim_digest(user_id: int) -> List[Tuple[int, int, str]]:
+    async with db.execute(
+        """SELECT d.rowid, d.attempts, o.payload FROM deliveries d JOIN outbox o ON o.job_id = d.job_id
+           WHERE d.user_id = ? AND d.status = 'digest' ORDER BY d.posted, d.rowid""",
+        (user_id,)
+    ) as cur:
+        return [tuple(row) async for row in cur]
+
+async def schedule_digest(user_id: int, due: int):
+    async with db_lock:
+        await db.execute("UPDATE subscribers SET digest_due = ? WHERE user_id = ?", (due, user_id))
+        await db.commit()
 
-                if len(jobs) >= DETAILS_LIMIT:
-                    break
+async def get_filters() -> Dict[int, Dict[str, Set[str]]]:
+    rules: Dict[int, Dict[str, Set[str]]] = {}
+    async with db.execute("SELECT user_id, kind, value FROM filters") as cur:
+        async for user_id, kind, value in cur:
+            rules.setdefault(user_id, {}).setdefault(kind, set()).add(value)
+    return rules
+
+async def add_filters(user_id: int, kind: str, values: List[str], replace: bool = False):
+    async with db_lock:
+        if replace:
+            await db.execute("DELETE FROM filters WHERE user_id = ? AND kind = ?", (user_id, kind))
+        await db.executemany(
+            "INSERT OR IGNORE INTO filters (user_id, kind, value) VALUES (?, ?, ?)",
+            [(user_id, kind, value) for value in values]
+        )
+        await db.commit()
 
-                next_btn = await page.query_selector("a[aria-label='Наступна сторінка']")
-                if next_btn:
-                    next_href = await next_btn.get_attribute("href")
-                    if next_href:
-                        url = "https://www.work.ua" + next_href
-                    else:
-                        break
-                else:
-                    break
+async def clear_filters(user_id: int, kind: str = None):
+    async with db_lock:
+        if kind:
+            await db.execute("DELETE FROM filters WHERE user_id = ? AND kind = ?", (user_id, kind))
+        else:
+            await db.execute("DELETE FROM filters WHERE user_id = ?", (user_id,))
+        await db.commit()
 
-            await browser.close()
-            logger.info(f"Парсинг сайта завершен.")
+async def claim_deliveries(after: Tuple[int, int], limit: int) -> List[Tuple[int, int, int, int, str]]:
+    async with db.execute(
+        """SELECT d.posted, d.rowid, d.user_id, d.attempts, o.payload FROM deliveries d JOIN outbox o ON o.job_id = d.job_id
+           WHERE d.status = 'pending' AND d.retry_at <= ? AND (d.posted, d.rowid) > (?, ?)
+           ORDER BY d.posted, d.rowid LIMIT ?""",
+        (int(time.time()), *after, limit)
+    ) as cur:
+        return [tuple(row) async for row in cur]
+
+async def save_delivery_results(results: List[Tuple[str, str, int, int]]):
+    async with db_lock:
+        await db.executemany(
+            "UPDATE deliveries SET status = ?, attempts = attempts + 1, updated = ?, retry_at = ? WHERE rowid = ?",
+            results
+        )
+        await db.commit()
 
-        return jobs
 
-class RobotaUA:
-    name = "robota.ua"
-    start_url = "https://robota.ua/zapros/ukraine/params;scheduleIds=3;rubrics=1-404,1-429,1-439;salaryType=false"
+# ================= ПОХОЖИЕ ВАКАНСИИ =================
+MINHASH_PRIME = (1 << 61) - 1
+_minhash_rng = random.Random(61)
+MINHASH_PARAMS = [
+    (_minhash_rng.randrange(1, MINHASH_PRIME), _minhash_rng.randrange(0, MINHASH_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+WORD_RE = re.compile(r"\w+")
+
+def shingles(text: str) -> Set[str]:
+    words = WORD_RE.findall(text.lower())
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash_signature(text: str) -> Optional[Tuple[int, ...]]:
+    hashes = [int.from_bytes(hashlib.blake2b(sh.encode(), digest_size=8).digest(), "little") for sh in shingles(text)]
+    if len(hashes) < NEAR_DUP_MIN_SHINGLES:
+        return None
+    return tuple(min([(a * h + b) % MINHASH_PRIME for h in hashes]) for a, b in MINHASH_PARAMS)
+
+def minhash_signatures(texts: List[str]) -> List[Optional[Tuple[int, ...]]]:
+    return [minhash_signature(text) for text in texts]
+
+def lsh_buckets(sig: Tuple[int, ...]) -> List[int]:
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    return [
+        int.from_bytes(
+            hashlib.blake2b(struct.pack(f"<I{rows}Q", band, *sig[band * rows:(band + 1) * rows]), digest_size=8).digest(),
+            "little", signed=True
+        )
+        for band in range(LSH_BANDS)
+    ]
+
+def pack_signature(sig: Tuple[int, ...]) -> bytes:
+    return struct.pack(f"<{len(sig)}Q", *sig)
+
+def unpack_signature(blob: bytes) -> Tuple[int, ...]:
+    return struct.unpack(f"<{len(blob) // 8}Q", blob)
+
+def signature_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+async def find_near_duplicate(sig: Tuple[int, ...]) -> Optional[Tuple[str, float]]:
+    buckets = lsh_buckets(sig)
+    placeholders = ",".join("?" * len(buckets))
+    best = None
+    async with db.execute(
+        f"SELECT COALESCE(original, job_id), sig FROM near_dup_sigs WHERE job_id IN "
+        f"(SELECT job_id FROM near_dup_bands WHERE bucket IN ({placeholders}))",
+        buckets
+    ) as cur:
+        async for job_id, blob in cur:
+            similarity = signature_similarity(sig, unpack_signature(blob))
+            if similarity >= NEAR_DUP_THRESHOLD and (best is None or similarity > best[1]):
+                best = (job_id, similarity)
+    return best
+
+async def store_signature(job_id: str, sig: Tuple[int, ...], original: str = None):
+    await db.execute(
+        "INSERT OR REPLACE INTO near_dup_sigs (job_id, sig, original) VALUES (?, ?, ?)",
+        (job_id, pack_signature(sig), original)
+    )
+    await db.executemany(
+        "INSERT OR IGNORE INTO near_dup_bands (bucket, job_id) VALUES (?, ?)",
+        [(bucket, job_id) for bucket in lsh_buckets(sig)]
+    )
 
-    async def run(self) -> List[Dict]:
-        logger.info(f"Начинается парсинг сайта: {self.name}")
-        jobs = []
-        url = self.start_url
+# ================= ФИЛЬТРЫ =================
+FILTER_KINDS = ("include", "exclude", "source", "since")
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+class KeywordMatcher:
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted(set(keywords))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for index, keyword in enumerate(self.keywords):
+            node = 0
+            for char in keyword:
+                child = self._goto[node].get(char)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][char] = child
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = child
+            self._out[node].append(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> Set[str]:
+        goto, fail, out, keywords = self._goto, self._fail, self._out, self.keywords
+        found = set()
+        node = 0
+        last = len(text) - 1
+        for pos, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in out[node]:
+                start = pos - len(keywords[index]) + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (pos == last or not text[pos + 1].isalnum()):
+                    found.add(keywords[index])
+        return found
+
+class FilterIndex:
+    def __init__(self, rules: Dict[int, Dict[str, Set[str]]]):
+        self.empty = not rules
+        self.include: Dict[str, Set[int]] = {}
+        self.exclude: Dict[str, Set[int]] = {}
+        self.include_users: Set[int] = set()
+        self.sources: Dict[str, Set[int]] = {}
+        self.source_users: Set[int] = set()
+        self.since: Dict[int, int] = {}
+        for user_id, user_rules in rules.items():
+            for keyword in user_rules.get("include", ()):
+                self.include.setdefault(keyword, set()).add(user_id)
+                self.include_users.add(user_id)
+            for keyword in user_rules.get("exclude", ()):
+                self.exclude.setdefault(keyword, set()).add(user_id)
+            for source in user_rules.get("source", ()):
+                self.sources.setdefault(source, set()).add(user_id)
+                self.source_users.add(user_id)
+            for since in user_rules.get("since", ()):
+                self.since[user_id] = parse_posted(since)
+        keywords = set(self.include) | set(self.exclude)
+        self.matcher = KeywordMatcher(keywords) if keywords else None
+
+    def rejected(self, job: Dict) -> Set[int]:
+        rejected = self.source_users - self.sources.get(job["source"], set())
+        posted = job.get("posted")
+        if posted:
+            rejected.update(user_id for user_id, since in self.since.items() if posted < since)
+        if self.matcher:
+            included = set()
+            for keyword in self.matcher.find(normalize_text(f"{job['title']}\n{job['description']}")):
+                included |= self.include.get(keyword, set())
+                rejected |= self.exclude.get(keyword, set())
+            rejected |= self.include_users - included
+        return rejected
+
+class SubscriberFilters:
+    def __init__(self):
+        self.rules: Dict[int, Dict[str, Set[str]]] = {}
+        self._index = FilterIndex({})
+
+    async def load(self):
+        self.rules = await get_filters()
+        self._rebuild()
+
+    async def add(self, user_id: int, kind: str, values: List[str]):
+        await add_filters(user_id, kind, values, replace=kind == "since")
+        user_rules = self.rules.setdefault(user_id, {})
+        if kind == "since":
+            user_rules.pop(kind, None)
+        user_rules.setdefault(kind, set()).update(values)
+        self._rebuild()
+
+    async def clear(self, user_id: int, kind: str = None):
+        await clear_filters(user_id, kind)
+        user_rules = self.rules.get(user_id, {})
+        if kind:
+            user_rules.pop(kind, None)
+        if not kind or not user_rules:
+            self.rules.pop(user_id, None)
+        self._rebuild()
+
+    def _rebuild(self):
+        # индекс собирается целиком и подменяется одним присваиванием: rejections() читает его из потока
+        self._index = FilterIndex(self.rules)
+
+    def rejected(self, job: Dict) -> Set[int]:
+        return self._index.rejected(job)
+
+    def rejections(self, jobs: List[Dict]) -> List[Set[int]]:
+        index = self._index
+        if index.empty:
+            return [set() for _ in jobs]
+        return [index.rejected(job) for job in jobs]
+
+subscriber_filters = SubscriberFilters()
+
+# ================= БРАУЗЕР =================
+class ResourcePolicy:
+    def __init__(self, allowed_types: Iterable[str] = (), allowed_domains: Iterable[str] = ()):
+        self.blocked_types = BLOCKED_RESOURCE_TYPES - frozenset(allowed_types)
+        self.allowed_domains = tuple(allowed_domains)
+
+    @staticmethod
+    def _matches(host: str, domains: Iterable[str]) -> bool:
+        return any(host == d or host.endswith("." + d) for d in domains)
+
+    def blocks(self, resource_type: str, url: str) -> bool:
+        host = urlsplit(url).hostname or ""
+        if self._matches(host, self.allowed_domains):
+            return False
+        return resource_type in self.blocked_types or self._matches(host, TRACKER_DOMAINS)
+
+class BrowserPool:
+    def __init__(self):
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._contexts: Dict[str, BrowserContext] = {}
+        self._context_pages: Dict[str, int] = {}
+        self._idle_pages: Dict[str, List[Page]] = {}
+        self._source_active: Dict[str, int] = {}
+        self._policies: Dict[str, ResourcePolicy] = {}
+        self.blocked: Dict[str, Dict[str, int]] = {}
+        self._lock = asyncio.Lock()
+        self._active_pages = 0
+        self._pages_served = 0
+
+    async def start(self):
+        async with self._lock:
+            try:
+                await self._launch()
+            except PlaywrightError as e:
+                # HTTP-источникам браузер не нужен: они работают дальше, а _acquire попробует запустить его снова
+                logger.error(f"Не удалось запустить браузер: {str(e).splitlines()[0]}")
+
+    async def close(self):
+        async with self._lock:
+            await self._shutdown_browser()
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
+
+    async def _launch(self):
+        if not self._playwright:
+            self._playwright = await async_playwright().start()
+        with metrics.timer("browser_launch", "browser"):
+            self._browser = await self._playwright.chromium.launch(headless=True)
+        self._pages_served = 0
+        logger.info("Браузер запущен.")
+
+    async def _shutdown_browser(self):
+        self._contexts.clear()
+        self._source_active.clear()
+        self._context_pages.clear()
+        self._idle_pages.clear()
+        if self._browser:
+            try:
+                await self._browser.close()
+            except PlaywrightError:
+                pass
+            self._browser = None
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+    def _healthy(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
 
-            for _ in range(PAGES_LIMIT):
-                await page.goto(url, wait_until="domcontentloaded")
+    async def _recycle(self, reason: str):
+        logger.warning(f"Перезапуск браузера: {reason}")
+        await self._shutdown_browser()
+        await self._launch()
 
+    async def health_check(self):
+        async with self._lock:
+            try:
+                if not self._healthy():
+                    await self._recycle("браузер не отвечает" if self._browser else "браузер не запущен")
+                elif self._active_pages == 0 and self._pages_served >= BROWSER_RECYCLE_PAGES:
+                    await self._recycle(f"выдано {self._pages_served} страниц")
+            except PlaywrightError as e:
+                logger.error(f"Не удалось запустить браузер: {str(e).splitlines()[0]}")
+
+    async def _route(self, source: str, route: Route):
+        request = route.request
+        if self._policies[source].blocks(request.resource_type, request.url):
+            stats = self.blocked.setdefault(source, {"requests": 0, "bytes": 0})
+            stats["requests"] += 1
+            stats["bytes"] += BLOCKED_BYTES_ESTIMATE.get(request.resource_type, 0)
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def take_blocked_stats(self, source: str) -> Dict[str, int]:
+        return self.blocked.pop(source, {"requests": 0, "bytes": 0})
+
+    async def _context(self, source: str) -> BrowserContext:
+        ctx = self._contexts.get(source)
+        if ctx and self._context_pages[source] >= CONTEXT_RECYCLE_PAGES and not self._source_active.get(source):
+            for page in self._idle_pages.pop(source, []):
                 try:
-                    await page.wait_for_selector("a.card[href*='/vacancy']", timeout=60000)
-                except PlaywrightTimeoutError:
-                    logger.warning(f"Путь к вакансиям на странице не найден или страница не загрузилась.")
-                    break
-                vacancies = await page.query_selector_all("a.card[href*='/vacancy']")
-
-                for v in vacancies:
-                    title_link = await v.query_selector("h2")
-                    if not title_link:
-                        continue
-
-                    href = await v.get_attribute("href")
-                    if not href:
-                        continue
-                    if href.startswith("/"):
-                        href = "https://robota.ua" + href
-                    title = (await title_link.inner_text()).strip() if title_link else ""
-
-                    job_page = await browser.new_page()
-                    await job_page.goto(href, wait_until="domcontentloaded")
-                    try:
-                        await job_page.wait_for_selector("div.full-desc", timeout=8000)
-                    except PlaywrightTimeoutError:
-                        logger.warning(f"Описание вакансии не найдено: {href}")
-                        pass
-                    desc_el = await job_page.query_selector("div.full-desc")
-                    desc = (await desc_el.inner_text()).strip() if desc_el else ""
-
-                    date_el = await job_page.wait_for_selector("span.santa-typo-regular.santa-whitespace-nowrap", timeout=5000)
-                    raw_date = (await date_el.inner_text()).strip() if date_el else ""
-
-                    date = ""
-                    if raw_date:
-                        parts = raw_date.split()
-                        if len(parts) >= 2:
-                            num_str, unit = parts[0], parts[1]
-                            try:
-                                num = int(num_str)
-                            except ValueError:
-                                num = 1
-
-                            now = datetime.now()
-
-                            if "день" in unit or "дн" in unit:
-                                date_obj = now - timedelta(days=num)
-                            elif "годин" in unit or "год" in unit:
-                                date_obj = now - timedelta(hours=num)
-                            elif "тиждень" in unit or "тижд" in unit:
-                                date_obj = now - timedelta(weeks=num)
-                            elif "місяць" in unit:
-                                date_obj = now - timedelta(days=30 * num)
-                            elif "рік" in unit:
-                                date_obj = now - timedelta(days=365 * num)
-                            else:
-                                date_obj = now
-
-                            date = date_obj.strftime("%d.%m.%Y %H:%M")
-                    await job_page.close()
-
-                    jobs.append({
-                        "title": title,
-                        "link": href,
-                        "description": desc,
-                        "source": self.name,
-                        "date": date if date else ""
-                    })
-
-                    if len(jobs) >= DETAILS_LIMIT:
-                        logger.info(f"Достигнут лимит вакансий, прекращаем сбор.")
-                        break
-
-                if len(jobs) >= DETAILS_LIMIT:
-                    break
-
-                next_btn = await page.query_selector("a[aria-label='Наступна сторінка']")
-                if next_btn:
-                    next_href = await next_btn.get_attribute("href")
-                    if next_href:
-                        url = "https://robota.ua" + next_href
-                    else:
-                        break
-                else:
-                    break
+                    await page.close()
+                except PlaywrightError:
+                    pass
+            try:
+                await ctx.close()
+            except PlaywrightError:
+                pass
+            ctx = None
+        if not ctx:
+            ctx = await self._browser.new_context()
+            await ctx.route("**/*", lambda route: self._route(source, route))
+            self._contexts[source] = ctx
+            self._context_pages[source] = 0
+            self._idle_pages[source] = []
+        return ctx
+
+    async def _acquire(self, source: str, policy: ResourcePolicy) -> Page:
+        async with self._lock:
+            self._policies[source] = policy
+            if not self._healthy():
+                await self._recycle("браузер упал" if self._browser else "браузер не запущен")
+            idle = self._idle_pages.get(source)
+            while idle:
+                page = idle.pop()
+                if not page.is_closed():
+                    self._active_pages += 1
+                    self._source_active[source] = self._source_active.get(source, 0) + 1
+                    return page
+            try:
+                page = await (await self._context(source)).new_page()
+            except PlaywrightError as e:
+                await self._recycle(f"не удалось открыть страницу ({e})")
+                page = await (await self._context(source)).new_page()
+            self._context_pages[source] += 1
+            self._pages_served += 1
+            self._active_pages += 1
+            self._source_active[source] = self._source_active.get(source, 0) + 1
+            return page
+
+    async def _release(self, source: str, page: Page, broken: bool):
+        async with self._lock:
+            self._active_pages = max(self._active_pages - 1, 0)
+            current = page.context is self._contexts.get(source)
+            if current:
+                self._source_active[source] -= 1
+            idle = self._idle_pages.get(source)
+            reusable = (
+                not broken
+                and current
+                and len(idle) < IDLE_PAGES_PER_SOURCE
+                and self._context_pages[source] < CONTEXT_RECYCLE_PAGES
+            )
+            if reusable and not page.is_closed():
+                idle.append(page)
+                return
+        try:
+            await page.close()
+        except PlaywrightError:
+            pass
+
+    @asynccontextmanager
+    async def page(self, source: str, policy: Optional[ResourcePolicy] = None):
+        page = await self._acquire(source, policy or ResourcePolicy())
+        broken = False
+        try:
+            yield page
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            await self._release(source, page, broken)
+
+# ================= HTTP =================
+class ListingResponse:
+    def __init__(self, text: Optional[str], unchanged: bool, cache_entry: Optional[Tuple] = None):
+        self.text = text
+        self.unchanged = unchanged
+        self.cache_entry = cache_entry
+
+class HttpClient:
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def take_stats(self, source: str) -> Dict[str, int]:
+        return self.stats.pop(source, {"pages": 0, "not_modified": 0, "same_hash": 0, "bytes_saved": 0})
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_CONNECTIONS, limit_per_host=HTTP_CONNECTIONS_PER_HOST,
+                                           ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+            headers=HTTP_HEADERS,
+        )
 
-            await browser.close()
-            logger.info(f"Парсинг сайта завершен.")
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
 
-        return jobs
+    async def get_text(self, url: str) -> Optional[str]:
+        try:
+            async with self._session.get(url) as resp:
+                if resp.status != 200:
+                    logger.warning(f"HTTP {resp.status}: {url}")
+                    return None
+                return await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Ошибка HTTP-запроса {url}: {e}")
+            return None
+
+    async def get_listing(self, url: str, source: str) -> Optional[ListingResponse]:
+        stats = self.stats.setdefault(source, {"pages": 0, "not_modified": 0, "same_hash": 0, "bytes_saved": 0})
+        cached = await get_http_cache(url)
+        headers = {}
+        if cached:
+            etag, last_modified, _, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        stats["pages"] += 1
+        try:
+            async with self._session.get(url, headers=headers) as resp:
+                if resp.status == 304 and cached:
+                    stats["not_modified"] += 1
+                    stats["bytes_saved"] += cached[3] or 0
+                    return ListingResponse(None, True)
+                if resp.status != 200:
+                    logger.warning(f"HTTP {resp.status}: {url}")
+                    return None
+                body = await resp.read()
+                text = await resp.text()
+                body_hash = hashlib.sha256(body).hexdigest()
+                if cached and cached[2] == body_hash:
+                    stats["same_hash"] += 1
+                    return ListingResponse(None, True)
+                entry = (url, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), body_hash, len(body))
+                return ListingResponse(text, False, entry)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Ошибка HTTP-запроса {url}: {e}")
+            return None
+
+
+# ================= СНИМКИ СТРАНИЦ =================
+class SnapshotStore:
+    def __init__(self, path: Optional[str], max_bytes: int = SNAPSHOT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+        self._total = 0
+        # в файл пишут и другие процессы сбора, поэтому размер перечитывается из базы каждые 1% лимита
+        self._unsynced = 0
+        self._sync_bytes = max(max_bytes // 100, 1)
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    async def open(self):
+        if not self.path or self._db is not None:
+            return
+        if zstandard is None:
+            logger.warning("Снимки страниц отключены: не установлен пакет zstandard.")
+            return
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        for pragma in DB_PRAGMAS:
+            await self._db.execute(pragma)
+        await self._db.execute("""CREATE TABLE IF NOT EXISTS snapshots(
+                id INTEGER PRIMARY KEY,
+                source TEXT,
+                kind TEXT,
+                url TEXT,
+                fetched TEXT,
+                size INTEGER,
+                body BLOB
+        )""")
+        await self._db.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_url ON snapshots(url, fetched)")
+        await self._db.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_source ON snapshots(source, kind)")
+        await self._db.commit()
+        cur = await self._db.execute("SELECT COALESCE(SUM(size), 0) FROM snapshots")
+        self._total = (await cur.fetchone())[0]
+        logger.info(f"Снимки страниц: {self.path}, {self._total / 1024 / 1024:.1f} МБ")
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def save(self, source: str, kind: str, url: str, html: str):
+        compressor = zstandard.ZstdCompressor(level=SNAPSHOT_ZSTD_LEVEL)
+        body = await asyncio.to_thread(compressor.compress, html.encode())
+        async with self._lock:
+            await self._db.execute(
+                "INSERT INTO snapshots (source, kind, url, fetched, size, body) VALUES (?, ?, ?, ?, ?, ?)",
+                (source, kind, url, datetime.now(timezone.utc).isoformat(), len(body), body)
+            )
+            await self._db.commit()
+            self._total += len(body)
+            self._unsynced += len(body)
+            if self._unsynced >= self._sync_bytes:
+                await self._evict()
+
+    async def _evict(self):
+        freed = 0
+        # сумма и удаление в одной пишущей транзакции, чтобы процессы не вытесняли одно и то же дважды
+        await self._db.execute("BEGIN IMMEDIATE")
+        try:
+            cur = await self._db.execute("SELECT COALESCE(SUM(size), 0) FROM snapshots")
+            self._total = (await cur.fetchone())[0]
+            self._unsynced = 0
+            if self._total > self.max_bytes:
+                target = self._total - self.max_bytes * 0.9
+                last_id = None
+                async with self._db.execute("SELECT id, size FROM snapshots ORDER BY id") as cur:
+                    async for row_id, size in cur:
+                        freed += size
+                        last_id = row_id
+                        if freed >= target:
+                            break
+                await self._db.execute("DELETE FROM snapshots WHERE id <= ?", (last_id,))
+                self._total -= freed
+            await self._db.commit()
+        except Exception:
+            await self._db.rollback()
+            raise
+        if freed:
+            await self._db.executescript("PRAGMA incremental_vacuum;")
+
+    async def iter_snapshots(self, source: str = None, limit: int = None) -> AsyncIterator[Tuple[str, str, str, str, str]]:
+        query = "SELECT source, kind, url, fetched, body FROM snapshots"
+        params: List = []
+        if source:
+            query += " WHERE source = ?"
+            params.append(source)
+        query += " ORDER BY id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        decompressor = zstandard.ZstdDecompressor()
+        async with self._db.execute(query, params) as cur:
+            async for source_name, kind, url, fetched, body in cur:
+                yield source_name, kind, url, fetched, decompressor.decompress(body).decode()
+
+snapshots = SnapshotStore(SNAPSHOT_PATH)
 
-class OlxUA:
-    name = "olx.ua"
-    start_url = "https://www.olx.ua/uk/rabota/it-telekom-kompyutery/drugoe/?currency=UAH&search%5Bfilter_enum_job_type%5D%5B0%5D=remote&search%5Bfilter_enum_job_type%5D%5B1%5D=perm&search%5Bfilter_enum_job_type%5D%5B2%5D=part_time&search%5Border%5D=created_at%3Adesc"
 
-    async def run(self) -> List[Dict]:
-        logger.info(f"Начинается парсинг сайта: {self.name}")
-        jobs = []
-        url = self.start_url
+# ================= ПОИСК =================
+LISTING_JS = """
+([selector, fields]) => {
+    const cards = Array.from(document.querySelectorAll(selector), card => {
+        const find = sel => sel ? card.querySelector(sel) : card;
+        const titleEl = find(fields.title);
+        const linkEl = find(fields.link);
+        const dateEl = fields.date ? card.querySelector(fields.date) : null;
+        let date = "";
+        if (dateEl) {
+            date = fields.date_attr ? (dateEl.getAttribute(fields.date_attr) || "") : dateEl.innerText.trim();
+        }
+        return {
+            title: titleEl ? titleEl.innerText.trim() : null,
+            href: linkEl ? linkEl.getAttribute("href") : null,
+            date: date,
+        };
+    });
+    const nextEl = document.querySelector("a[aria-label='Наступна сторінка']");
+    return {cards: cards, next: nextEl ? nextEl.getAttribute("href") : null};
+}
+"""
+
+DETAIL_JS = """
+([selector, dateSelector]) => {
+    const text = sel => {
+        const el = sel ? document.querySelector(sel) : null;
+        return el ? el.innerText.trim() : "";
+    };
+    return {description: text(selector), date: text(dateSelector)};
+}
+"""
+
+BLOCK_TAGS = frozenset({
+    "address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "fieldset", "figcaption",
+    "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main",
+    "nav", "ol", "p", "pre", "section", "table", "tr", "ul",
+})
+SKIP_TAGS = frozenset({"script", "style", "noscript", "template", "-comment"})
+
+def node_text(node: LexborNode) -> str:
+    parts: List[str] = []
+
+    def walk(parent: LexborNode):
+        for child in parent.iter(include_text=True):
+            tag = child.tag
+            if tag == "-text":
+                parts.append(child.text(deep=False))
+            elif tag == "br":
+                parts.append("\n")
+            elif tag not in SKIP_TAGS:
+                block = tag in BLOCK_TAGS
+                if block:
+                    parts.append("\n")
+                walk(child)
+                if block:
+                    parts.append("\n")
+
+    walk(node)
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+def extract_listing_html(tree: LexborHTMLParser, selector: str, fields: Dict[str, Optional[str]]) -> Dict:
+    cards = []
+    for card in tree.css(selector):
+        title_el = card.css_first(fields["title"]) if fields["title"] else card
+        link_el = card.css_first(fields["link"]) if fields["link"] else card
+        date_el = card.css_first(fields["date"]) if fields["date"] else None
+        date = ""
+        if date_el:
+            date = (date_el.attributes.get(fields["date_attr"]) or "") if fields["date_attr"] else node_text(date_el)
+        cards.append({
+            "title": node_text(title_el) if title_el else None,
+            "href": link_el.attributes.get("href") if link_el else None,
+            "date": date,
+        })
+    next_el = tree.css_first("a[aria-label='Наступна сторінка']")
+    return {"cards": cards, "next": next_el.attributes.get("href") if next_el else None}
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.failures = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.opened_at = 0.0
+        self.last_error = ""
+
+    def retry_in(self, now: float) -> float:
+        return max(0.0, self.opened_at + self.cooldown - now)
+
+    def allow(self) -> bool:
+        if self.state == "open" and self.retry_in(asyncio.get_running_loop().time()) == 0:
+            self.state = "half_open"
+            logger.info(f"{self.name}: пробный запуск после паузы")
+        return self.state != "open"
+
+    @property
+    def probing(self) -> bool:
+        return self.state == "half_open"
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"{self.name}: источник снова работает")
+        self.state = "closed"
+        self.failures = 0
+        self.cooldown = BREAKER_COOLDOWN
+
+    def record_failure(self, error: str):
+        self.failures += 1
+        self.last_error = error
+        if self.state == "open":
+            return
+        if self.state == "half_open":
+            self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+        elif self.failures < BREAKER_THRESHOLD:
+            return
+        self.state = "open"
+        self.opened_at = asyncio.get_running_loop().time()
+        logger.warning(f"{self.name}: ошибок подряд: {self.failures} (последняя: {error}), "
+                       f"источник отключён на {self.cooldown / 60:.0f} мин.")
+
+    def describe(self, now: float) -> str:
+        if self.state == "open":
+            return f"отключён ещё {self.retry_in(now) / 60:.0f} мин. ({self.last_error})"
+        if self.state == "half_open":
+            return "пробный запуск"
+        return f"ошибок подряд: {self.failures}" if self.failures else "работает"
+
+breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    return breakers.setdefault(name, CircuitBreaker(name))
+
+class BaseParser:
+    name = ""
+    start_url = ""
+    http_fast_path = False
+    listing_selector = ""
+    listing_timeout = 8000
+    card_fields: Dict[str, Optional[str]] = {}
+    detail_selector = ""
+    detail_timeout = 8000
+    detail_date_selector: Optional[str] = None
+    allowed_resources: Tuple[str, ...] = ()
+    allowed_domains: Tuple[str, ...] = ()
+    details_concurrency = DETAILS_CONCURRENCY
+    request_delay = DETAILS_DELAY
+    time_budget = SOURCE_TIME_BUDGET
+
+    def __init__(self, pool: BrowserPool, http: Optional[HttpClient] = None, start_url: Optional[str] = None):
+        self.pool = pool
+        self.http = http
+        if start_url:
+            self.start_url = start_url
+        self.resource_policy = ResourcePolicy(self.allowed_resources, self.allowed_domains)
+        self.breaker = get_breaker(self.name)
+        self.jobs: List[Dict] = []
+        self.http_cache_updates: List[Tuple] = []
+        self._pending_cache: Dict[str, Tuple] = {}
+        self.listing_found = False
+        self._polite_lock = asyncio.Lock()
+        self._last_request = 0.0
+
+    def format_date(self, raw_date: str) -> str:
+        return raw_date
+
+    def card_from_record(self, record: Dict, page_url: str) -> Optional[Dict]:
+        href = record["href"]
+        if record["title"] is None or not href:
+            return None
+        return {"title": record["title"], "link": urljoin(page_url, href), "date": self.format_date(record["date"])}
+
+    def make_job(self, card: Dict, description: str, date: str = None) -> Dict:
+        date = card["date"] if date is None else date
+        return {
+            "title": card["title"],
+            "link": card["link"],
+            "description": description,
+            "source": self.name,
+            "date": date if date else "",
+            "posted": parse_posted(date)
+        }
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+    def _listing_from_records(self, listing: Dict, page_url: str) -> Tuple[List[Dict], Optional[str]]:
+        cards = [card for card in (self.card_from_record(r, page_url) for r in listing["cards"]) if card]
+        next_url = urljoin(page_url, listing["next"]) if listing["next"] else None
+        return cards, next_url
 
-            for _ in range(PAGES_LIMIT):
-                await page.goto(url, wait_until="domcontentloaded")
+    async def parse_listing(self, page: Page) -> Tuple[List[Dict], Optional[str]]:
+        listing = await page.evaluate(LISTING_JS, [self.listing_selector, self.card_fields])
+        return self._listing_from_records(listing, page.url)
 
+    async def parse_detail(self, page: Page, card: Dict) -> Dict:
+        try:
+            with metrics.timer("detail_wait", self.name):
+                await page.wait_for_selector(self.detail_selector, timeout=self.detail_timeout)
+        except PlaywrightTimeoutError:
+            metrics.inc("timeouts", source=self.name, stage="detail_wait")
+            logger.warning(f"Описание вакансии не найдено: {card['link']}")
+        else:
+            if self.detail_date_selector:
                 try:
-                    await page.wait_for_selector("div.jobs-ad-card", timeout=8000)
+                    with metrics.timer("date_wait", self.name):
+                        await page.wait_for_selector(self.detail_date_selector, timeout=5000)
                 except PlaywrightTimeoutError:
-                    logger.warning("Путь к вакансиям на странице не найден или страница не загрузилась.")
-                    break
-
-                vacancies = await page.query_selector_all("div.jobs-ad-card")
-
-                for v in vacancies:
-                    title_link = await v.query_selector("div.css-1s4cikj a")
-                    if not title_link:
-                        continue
-
-                    href = await title_link.get_attribute("href")
-                    if not href:
-                        continue
-
-                    if href.startswith("/"):
-                        href = "https://www.olx.ua" + href
-
-                    title = (await title_link.inner_text()).strip() if title_link else ""
-
-                    date_el = await v.query_selector("p.css-996jis")
-                    raw_date = (await date_el.inner_text()).strip() if date_el else ""
-
-                    ukr_months = {
-                        "січня": "01", "лютого": "02", "березня": "03", "квітня": "04",
-                        "травня": "05", "червня": "06", "липня": "07", "серпня": "08",
-                        "вересня": "09", "жовтня": "10", "листопада": "11", "грудня": "12"
-                    }
-
-                    date = ""
-                    now = datetime.now()
-
-                    if raw_date:
-                        raw_lower = raw_date.lower()
-                        if "сьогодні" in raw_lower:
-                            time_part = raw_date.split("о")[-1].strip() if "о" in raw_date else "00:00"
-                            try:
-                                t = datetime.strptime(time_part, "%H:%M").time()
-                            except ValueError:
-                                t = datetime.min.time()
-                            date = now.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0).strftime(
-                                "%d.%m.%Y %H:%M")
-                        elif "вчора" in raw_lower:
-                            time_part = raw_date.split("о")[-1].strip() if "о" in raw_date else "00:00"
-                            try:
-                                t = datetime.strptime(time_part, "%H:%M").time()
-                            except ValueError:
-                                t = datetime.min.time()
-                            yesterday = now - timedelta(days=1)
-                            date = yesterday.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0).strftime(
-                                "%d.%m.%Y %H:%M")
-                        else:
-                            parts = raw_date.split()
-                            if len(parts) >= 3:
-                                day = parts[0]
-                                month_ua = parts[1].lower()
-                                year = parts[2].replace("р.", "")
-                                month = ukr_months.get(month_ua, "01")
-                                date = f"{int(day):02d}.{month}.{year}"
-                            else:
-                                date = raw_date
-
-                    job_page = await browser.new_page()
-                    await job_page.goto(href, wait_until="domcontentloaded")
-                    try:
-                        desc_el = await job_page.wait_for_selector("div.css-1i3492", timeout=8000)
-                        desc = (await desc_el.inner_text()).strip()
-                    except PlaywrightTimeoutError:
-                        logger.warning(f"Описание вакансии не найдено: {href}")
-                        desc = ""
-                    await job_page.close()
-
-                    jobs.append({
-                        "title": title,
-                        "link": href,
-                        "description": desc,
-                        "source": self.name,
-                        "date": date if date else ""
-                    })
-
-                    if len(jobs) >= DETAILS_LIMIT:
-                        logger.info(f"Достигнут лимит вакансий, прекращаем сбор.")
-                        break
-                if len(jobs) >= DETAILS_LIMIT:
-                    break
-                next_btn = await page.query_selector("a[aria-label='Наступна сторінка']")
-                if next_btn:
-                    next_href = await next_btn.get_attribute("href")
-                    if next_href:
-                        url = "https://www.olx.ua" + next_href
-                    else:
-                        break
-                else:
-                    break
-            await browser.close()
-            logger.info(f"Парсинг сайта завершен.")
-        return jobs
-
-class DouUA:
-    name = "dou.ua"
-    start_url = "https://jobs.dou.ua/vacancies/?category=Python&exp=1-3"
-
-    async def run(self) -> List[Dict]:
-        logger.info(f"Начинается парсинг сайта: {self.name}")
-        jobs = []
+                    metrics.inc("timeouts", source=self.name, stage="date_wait")
+                    logger.warning(f"Дата вакансии не найдена: {card['link']}")
+        with metrics.timer("extract", self.name):
+            record = await page.evaluate(DETAIL_JS, [self.detail_selector, self.detail_date_selector])
+        date = self.format_date(record["date"]) if self.detail_date_selector else None
+        return self.make_job(card, record["description"], date)
+
+    def parse_listing_html(self, html: str, page_url: str) -> Optional[Tuple[List[Dict], Optional[str]]]:
+        tree = LexborHTMLParser(html)
+        if not tree.css_first(self.listing_selector):
+            return None
+        return self._listing_from_records(extract_listing_html(tree, self.listing_selector, self.card_fields), page_url)
+
+    def parse_detail_html(self, html: str, card: Dict) -> Dict:
+        tree = LexborHTMLParser(html)
+        desc_el = tree.css_first(self.detail_selector)
+        if not desc_el:
+            logger.warning(f"Описание вакансии не найдено: {card['link']}")
+        date = None
+        if self.detail_date_selector:
+            date_el = tree.css_first(self.detail_date_selector)
+            date = self.format_date(node_text(date_el) if date_el else "")
+        return self.make_job(card, node_text(desc_el) if desc_el else "", date)
+
+    async def _polite(self):
+        async with self._polite_lock:
+            delay = self._last_request + self.request_delay - asyncio.get_running_loop().time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_request = asyncio.get_running_loop().time()
+
+    async def _fetch_detail(self, semaphore: asyncio.Semaphore, card: Dict,
+                            fetch: Callable[[Dict], Awaitable[Optional[Dict]]]) -> Optional[Dict]:
+        async with semaphore:
+            if not self.breaker.allow():
+                return None
+            await self._polite()
+            metrics.inc("pages", source=self.name, kind="detail")
+            try:
+                with metrics.timer("detail", self.name):
+                    job = await fetch(card)
+            except (PlaywrightError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Не удалось открыть вакансию {card['link']}: {e}")
+                metrics.inc("errors", source=self.name, stage="detail")
+                self.breaker.record_failure(f"вакансия: {type(e).__name__}")
+                return None
+            if job and job["description"]:
+                self.breaker.record_success()
+                return job
+            # без описания все такие вакансии источника получили бы один id — считаем загрузку неудачной,
+            # ссылка не попадёт в базу и будет открыта снова в следующем цикле
+            metrics.inc("errors", source=self.name, stage="detail")
+            self.breaker.record_failure("вакансия: нет описания")
+            return None
+
+    async def stream_details(self, cards: List[Dict],
+                             fetch: Callable[[Dict], Awaitable[Optional[Dict]]]) -> AsyncIterator[Dict]:
+        semaphore = asyncio.Semaphore(self.details_concurrency)
+        tasks = [asyncio.create_task(self._fetch_detail(semaphore, card, fetch)) for card in cards]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                job = await next_done
+                if job:
+                    yield job
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def split_known(self, cards: List[Dict], known: Set[str], streak: int,
+                    incremental: bool) -> Tuple[List[Dict], int, bool]:
+        fresh = []
+        for card in cards:
+            if canonical_link(card["link"]) not in known:
+                streak = 0
+                fresh.append(card)
+                continue
+            streak += 1
+            if incremental and streak >= KNOWN_STREAK_LIMIT:
+                return fresh, streak, True
+        return fresh, streak, False
+
+    async def _crawl(self, open_listing: Callable[[str], Awaitable[Optional[Tuple[List[Dict], Optional[str]]]]],
+                     fetch_detail: Callable[[Dict], Awaitable[Optional[Dict]]]) -> AsyncIterator[Dict]:
+        jobs = self.jobs
         url = self.start_url
+        incremental = INCREMENTAL_CRAWL and await get_newest_link(self.name) is not None
+        newest = None
+        streak = 0
+        probing = self.breaker.probing
+
+        for _ in range(1 if probing else PAGES_LIMIT):
+            if not self.breaker.allow():
+                logger.warning(f"{self.name}: источник отключён после ошибок, сбор прерван.")
+                break
+            metrics.inc("pages", source=self.name, kind="listing")
+            with metrics.timer("listing", self.name):
+                listing = await open_listing(url)
+            if listing is None:
+                logger.warning("Путь к вакансиям на странице не найден или страница не загрузилась.")
+                break
+            self.listing_found = True
+
+            page_url = url
+            cards, url = listing
+            if newest is None and cards:
+                newest = canonical_link(cards[0]["link"])
+            known = await known_links(card["link"] for card in cards)
+            fresh, streak, seen_through = self.split_known(cards, known, streak, incremental)
+            if len(fresh) < len(cards):
+                logger.info(f"{self.name}: пропущено уже известных вакансий: {len(cards) - len(fresh)}")
+            batch = fresh[:1 if probing else DETAILS_LIMIT - len(jobs)]
+            if not (probing and batch):
+                self.breaker.record_success()
+            fetched = 0
+            async for job in self.stream_details(batch, fetch_detail):
+                fetched += 1
+                jobs.append(job)
+                yield job
+            if len(batch) == len(fresh) == fetched and page_url in self._pending_cache:
+                self.http_cache_updates.append(self._pending_cache.pop(page_url))
+
+            if len(jobs) >= DETAILS_LIMIT:
+                logger.info(f"Достигнут лимит вакансий, прекращаем сбор.")
+                break
+
+            if seen_through:
+                logger.info(f"{self.name}: {KNOWN_STREAK_LIMIT} известных вакансий подряд, дальше страницы не листаем.")
+                break
+
+            if not url:
+                break
+
+        if newest:
+            await save_newest_link(self.name, newest)
+
+    async def _snapshot(self, kind: str, url: str, html: Optional[str] = None, page: Optional[Page] = None):
+        if not snapshots.enabled:
+            return
+        try:
+            await snapshots.save(self.name, kind, url, html if html is not None else await page.content())
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить снимок {url}: {e}")
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+    async def _browser_listing(self, page: Page, url: str) -> Optional[Tuple[List[Dict], Optional[str]]]:
+        with metrics.timer("goto", self.name):
+            await page.goto(url, wait_until="domcontentloaded")
+        try:
+            with metrics.timer("listing_wait", self.name):
+                await page.wait_for_selector(self.listing_selector, timeout=self.listing_timeout)
+        except PlaywrightTimeoutError:
+            metrics.inc("timeouts", source=self.name, stage="listing_wait")
+            await self._snapshot("listing", url, page=page)
+            return None
+        await self._snapshot("listing", url, page=page)
+        with metrics.timer("extract", self.name):
+            return await self.parse_listing(page)
+
+    async def _browser_detail(self, card: Dict) -> Dict:
+        async with self.pool.page(self.name, self.resource_policy) as job_page:
+            with metrics.timer("goto", self.name):
+                await job_page.goto(card["link"], wait_until="domcontentloaded")
+            job = await self.parse_detail(job_page, card)
+            await self._snapshot("detail", card["link"], page=job_page)
+            return job
+
+    async def _http_listing(self, url: str) -> Optional[Tuple[List[Dict], Optional[str]]]:
+        with metrics.timer("http_get", self.name):
+            response = await self.http.get_listing(url, self.name)
+        if response is None:
+            return None
+        if response.unchanged:
+            logger.info(f"{self.name}: страница не изменилась с прошлого цикла, пропускаем: {url}")
+            return [], None
+        await self._snapshot("listing", url, response.text)
+        with metrics.timer("extract", self.name):
+            listing = self.parse_listing_html(response.text, url)
+        if listing:
+            self._pending_cache[url] = response.cache_entry
+        return listing
+
+    async def _http_detail(self, card: Dict) -> Optional[Dict]:
+        with metrics.timer("http_get", self.name):
+            html = await self.http.get_text(card["link"])
+        if not html:
+            return None
+        await self._snapshot("detail", card["link"], html)
+        with metrics.timer("extract", self.name):
+            return self.parse_detail_html(html, card)
+
+    async def stream_browser(self) -> AsyncIterator[Dict]:
+        async with self.pool.page(self.name, self.resource_policy) as page:
+            async for job in self._crawl(lambda url: self._browser_listing(page, url), self._browser_detail):
+                yield job
+
+    def stream_http(self) -> AsyncIterator[Dict]:
+        return self._crawl(self._http_listing, self._http_detail)
+
+    async def stream(self) -> AsyncIterator[Dict]:
+        logger.info(f"Начинается парсинг сайта: {self.name}")
+        try:
+            if self.http_fast_path and self.http:
+                async for job in self.stream_http():
+                    yield job
+                if self.listing_found:
+                    logger.info(f"Парсинг сайта завершен.")
+                    return
+                logger.warning(f"{self.name}: по HTTP вакансии не найдены, переключаемся на браузер.")
+            async for job in self.stream_browser():
+                yield job
+        except (PlaywrightError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.breaker.record_failure(f"список: {type(e).__name__}")
+            raise
+        if not self.listing_found:
+            self.breaker.record_failure("список: карточки не найдены")
+        logger.info(f"Парсинг сайта завершен.")
+
+    async def run_http(self) -> List[Dict]:
+        return [job async for job in self.stream_http()]
 
-            for _ in range(PAGES_LIMIT):
-                await page.goto(url, wait_until="domcontentloaded")
+    async def run(self) -> List[Dict]:
+        return [job async for job in self.stream()]
 
+class WorkUA(BaseParser):
+    name = "work.ua"
+    start_url = (f"https://www.work.ua/jobs-it-industry-it/?advs=1&sort=date&days={LISTING_MAX_AGE_DAYS}"
+                 "&language=1+41&language_level=1-83+1-84+41-22836")
+    http_fast_path = True
+    listing_selector = "div.card.card-hover.card-visited.wordwrap.job-link"
+    card_fields = {
+        "title": "h2.my-0 a",
+        "link": "h2.my-0 a",
+        "date": "div.flex.flex-align-center.flex-wrap time",
+        "date_attr": "datetime",
+    }
+    detail_selector = "div#job-description"
+    detail_timeout = 5000
+
+    def format_date(self, raw_date: str) -> str:
+        if not raw_date:
+            return ""
+        dt = datetime.strptime(raw_date, "%Y-%m-%d %H:%M:%S")
+        return dt.strftime("%d.%m.%Y %H:%M")
+
+class RobotaUA(BaseParser):
+    name = "robota.ua"
+    start_url = "https://robota.ua/zapros/ukraine/params;scheduleIds=3;rubrics=1-404,1-429,1-439;salaryType=false"
+    listing_selector = "a.card[href*='/vacancy']"
+    listing_timeout = 60000
+    card_fields = {"title": "h2", "link": None, "date": None, "date_attr": None}
+    detail_selector = "div.full-desc"
+    detail_date_selector = "span.santa-typo-regular.santa-whitespace-nowrap"
+
+    def format_date(self, raw_date: str) -> str:
+        date = ""
+        if raw_date:
+            parts = raw_date.split()
+            if len(parts) >= 2:
+                num_str, unit = parts[0], parts[1]
                 try:
-                    await page.wait_for_selector("li.l-vacancy", timeout=8000)
-                except PlaywrightTimeoutError:
-                    logger.warning("Путь к вакансиям на странице не найден или страница не загрузилась.")
-                    break
-
-                vacancies = await page.query_selector_all("li.l-vacancy")
-
-                for v in vacancies:
-                    title_link = await v.query_selector("div.title a.vt")
-                    if not title_link:
-                        continue
-
-                    href = await title_link.get_attribute("href")
-                    title = (await title_link.inner_text()).strip() if title_link else ""
-
-                    date_el = await v.query_selector("div.date")
-                    raw_date = (await date_el.inner_text()).strip() if date_el else ""
-
-                    ukr_months = {
-                        "січня": "01", "лютого": "02", "березня": "03", "квітня": "04",
-                        "травня": "05", "червня": "06", "липня": "07", "серпня": "08",
-                        "вересня": "09", "жовтня": "10", "листопада": "11", "грудня": "12"
-                    }
-
-                    if raw_date:
-                        parts = raw_date.split()
-                        if len(parts) == 2:
-                            day, month_ua = parts
-                            month = ukr_months.get(month_ua.lower(), "01")
-                            year = datetime.now().year
-                            date = f"{int(day):02d}.{month}.{year}"
-                        else:
-                            date = raw_date
-                    else:
-                        date = ""
-
-                    job_page = await browser.new_page()
-                    await job_page.goto(href, wait_until="domcontentloaded")
-                    try:
-                        await job_page.wait_for_selector("div.b-typo.vacancy-section", timeout=8000)
-                    except PlaywrightTimeoutError:
-                        logger.warning(f"Описание вакансии не найдено: {href}")
-                        pass
-                    desc_el = await job_page.query_selector("div.b-typo.vacancy-section")
-                    desc = (await desc_el.inner_text()).strip() if desc_el else ""
-                    await job_page.close()
-
-                    jobs.append({
-                        "title": title,
-                        "link": href,
-                        "description": desc,
-                        "source": self.name,
-                        "date": date if date else ""
-                    })
-
-                    if len(jobs) >= DETAILS_LIMIT:
-                        logger.info(f"Достигнут лимит вакансий, прекращаем сбор.")
-                        break
-
-                if len(jobs) >= DETAILS_LIMIT:
-                    break
-
-                next_btn = await page.query_selector("a[aria-label='Наступна сторінка']")
-                if next_btn:
-                    next_href = await next_btn.get_attribute("href")
-                    if next_href:
-                        url = "https://jobs.dou.ua" + next_href
-                    else:
-                        break
+                    num = int(num_str)
+                except ValueError:
+                    num = 1
+
+                now = datetime.now(SOURCE_TZ)
+
+                if "день" in unit or "дн" in unit:
+                    date_obj = now - timedelta(days=num)
+                elif "годин" in unit or "год" in unit:
+                    date_obj = now - timedelta(hours=num)
+                elif "тиждень" in unit or "тижд" in unit:
+                    date_obj = now - timedelta(weeks=num)
+                elif "місяць" in unit:
+                    date_obj = now - timedelta(days=30 * num)
+                elif "рік" in unit:
+                    date_obj = now - timedelta(days=365 * num)
                 else:
-                    break
-
-            await browser.close()
-            logger.info(f"Парсинг сайта завершен.")
-
-        return jobs
-
-class Djinni:
-    name = "djinni.co"
-    start_url = "https://djinni.co/jobs/?primary_keyword=Python&exp_level=1y&exp_level=2y&employment=remote"
-
-    async def run(self) -> List[Dict]:
-        logger.info(f"Начинается парсинг сайта: {self.name}")
-        jobs = []
-        url = self.start_url
-
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+                    date_obj = now
 
-            for _ in range(PAGES_LIMIT):
-                await page.goto(url, wait_until="domcontentloaded")
+                date = date_obj.strftime("%d.%m.%Y %H:%M")
+        return date
 
+class OlxUA(BaseParser):
+    name = "olx.ua"
+    start_url = "https://www.olx.ua/uk/rabota/it-telekom-kompyutery/drugoe/?currency=UAH&search%5Bfilter_enum_job_type%5D%5B0%5D=remote&search%5Bfilter_enum_job_type%5D%5B1%5D=perm&search%5Bfilter_enum_job_type%5D%5B2%5D=part_time&search%5Border%5D=created_at%3Adesc"
+    listing_selector = "div.jobs-ad-card"
+    card_fields = {"title": "div.css-1s4cikj a", "link": "div.css-1s4cikj a", "date": "p.css-996jis", "date_attr": None}
+    detail_selector = "div.css-1i3492"
+
+    def format_date(self, raw_date: str) -> str:
+        date = ""
+        now = datetime.now(SOURCE_TZ)
+
+        if raw_date:
+            raw_lower = raw_date.lower()
+            if "сьогодні" in raw_lower:
+                time_part = raw_date.split("о")[-1].strip() if "о" in raw_date else "00:00"
                 try:
-                    await page.wait_for_selector("ul.list-unstyled.list-jobs.mb-4 li", timeout=8000)
-                except PlaywrightTimeoutError:
-                    logger.warning("Путь к вакансиям на странице не найден или страница не загрузилась.")
-                    break
-
-                vacancies = await page.query_selector_all("ul.list-unstyled.list-jobs.mb-4 li")
-
-                for v in vacancies:
-                    title_link = await v.query_selector("h2.fs-3.mb-2 a.job-item__title-link")
-                    if not title_link:
-                        continue
-
-                    href = await title_link.get_attribute("href")
-                    if not href:
-                        continue
-                    if href.startswith("/"):
-                        href = "https://djinni.co" + href
-
-                    title = (await title_link.inner_text()).strip()
-
-                    date_el = await v.query_selector("span.text-nowrap[data-original-title]")
-                    date_attr = await date_el.get_attribute("data-original-title")
-                    date = date_attr.split()[1] if date_attr else ""
-
-                    job_page = await browser.new_page()
-                    await job_page.goto(href, wait_until="domcontentloaded")
-                    try:
-                        await job_page.wait_for_selector("div.mb-4.job-post__description", timeout=8000)
-                    except PlaywrightTimeoutError:
-                        logger.warning(f"Описание вакансии не найдено: {href}")
-                        pass
-                    desc_el = await job_page.query_selector("div.mb-4.job-post__description")
-                    desc = (await desc_el.inner_text()).strip() if desc_el else ""
-                    await job_page.close()
-
-                    jobs.append({
-                        "title": title,
-                        "link": href,
-                        "description": desc,
-                        "source": self.name,
-                        "date": date if date else ""
-                    })
-
-                    if len(jobs) >= DETAILS_LIMIT:
-                        logger.info(f"Достигнут лимит вакансий, прекращаем сбор.")
-                        break
-
-                if len(jobs) >= DETAILS_LIMIT:
-                    break
-
-                next_btn = await page.query_selector("a[aria-label='Наступна сторінка']")
-                if next_btn:
-                    next_href = await next_btn.get_attribute("href")
-                    if next_href:
-                        url = "https://djinni.co/jobs" + next_href
-                    else:
-                        break
+                    t = datetime.strptime(time_part, "%H:%M").time()
+                except ValueError:
+                    t = datetime.min.time()
+                date = now.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0).strftime(
+                    "%d.%m.%Y %H:%M")
+            elif "вчора" in raw_lower:
+                time_part = raw_date.split("о")[-1].strip() if "о" in raw_date else "00:00"
+                try:
+                    t = datetime.strptime(time_part, "%H:%M").time()
+                except ValueError:
+                    t = datetime.min.time()
+                yesterday = now - timedelta(days=1)
+                date = yesterday.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0).strftime(
+                    "%d.%m.%Y %H:%M")
+            else:
+                parts = raw_date.split()
+                if len(parts) >= 3:
+                    day = parts[0]
+                    month_ua = parts[1].lower()
+                    year = parts[2].replace("р.", "")
+                    month = UKR_MONTHS.get(month_ua, "01")
+                    date = f"{int(day):02d}.{month}.{year}"
                 else:
-                    break
-
-            await browser.close()
-            logger.info(f"Парсинг сайта завершен.")
+                    date = raw_date
+        return date
 
-        return jobs
+class DouUA(BaseParser):
+    name = "dou.ua"
+    start_url = "https://jobs.dou.ua/vacancies/?category=Python&exp=1-3"
+    http_fast_path = True
+    listing_selector = "li.l-vacancy"
+    card_fields = {"title": "div.title a.vt", "link": "div.title a.vt", "date": "div.date", "date_attr": None}
+    detail_selector = "div.b-typo.vacancy-section"
+
+    def format_date(self, raw_date: str) -> str:
+        if not raw_date:
+            return ""
+        parts = raw_date.split()
+        if len(parts) == 2:
+            day, month_ua = parts
+            month = UKR_MONTHS.get(month_ua.lower(), "01")
+            year = assume_year(int(day), int(month), datetime.now(SOURCE_TZ))
+            return f"{int(day):02d}.{month}.{year}"
+        return raw_date
+
+class Djinni(BaseParser):
+    name = "djinni.co"
+    start_url = "https://djinni.co/jobs/?primary_keyword=Python&exp_level=1y&exp_level=2y&employment=remote"
+    http_fast_path = True
+    listing_selector = "ul.list-unstyled.list-jobs.mb-4 li"
+    card_fields = {
+        "title": "h2.fs-3.mb-2 a.job-item__title-link",
+        "link": "h2.fs-3.mb-2 a.job-item__title-link",
+        "date": "span.text-nowrap[data-original-title]",
+        "date_attr": "data-original-title",
+    }
+    detail_selector = "div.mb-4.job-post__description"
+
+    def format_date(self, raw_date: str) -> str:
+        # в атрибуте "09:00 18.10.2026" — время нужно для дат публикации внутри дня
+        parts = raw_date.split()
+        if len(parts) == 2 and ":" in parts[0]:
+            return f"{parts[1]} {parts[0]}"
+        return raw_date.strip()
 
 # ================= ОТПРАВКА =================
-async def send_job(job: Dict):
-    text = (
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if self._updated:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class Broadcaster:
+    def __init__(self):
+        self.subscribers: Set[int] = set()
+        self._bucket = TokenBucket(TELEGRAM_RATE, TELEGRAM_RATE)
+        self._chat_ready: Dict[int, float] = {}
+        self._paused_until = 0.0
+
+    async def load(self):
+        self.subscribers = set(await get_subscribers())
+        logger.info(f"Загружено подписчиков: {len(self.subscribers)}")
+
+    def add(self, user_id: int):
+        self.subscribers.add(user_id)
+
+    def discard(self, user_id: int):
+        self.subscribers.discard(user_id)
+        self._chat_ready.pop(user_id, None)
+
+    async def _wait_turn(self, user_id: int):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._chat_ready.get(user_id, 0.0))
+        self._chat_ready[user_id] = slot + TELEGRAM_CHAT_INTERVAL
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        while self._paused_until > loop.time():
+            await asyncio.sleep(self._paused_until - loop.time())
+        await self._bucket.acquire()
+
+    async def send(self, user_id: int, text: str) -> str:
+        # "sent", "failed" — повторять бесполезно, "retry" — временная ошибка, доставку стоит повторить позже
+        for _ in range(SEND_RETRIES):
+            await self._wait_turn(user_id)
+            try:
+                with metrics.timer("send", "telegram"):
+                    await bot.send_message(user_id, text, disable_web_page_preview=True)
+                metrics.inc("sends", status="sent")
+                return "sent"
+            except exceptions.TelegramRetryAfter as e:
+                metrics.inc("sends", status="retry_after")
+                logger.warning(f"Telegram просит подождать {e.retry_after} с (пользователь {user_id})")
+                self._paused_until = max(self._paused_until, asyncio.get_running_loop().time() + e.retry_after)
+            except exceptions.TelegramForbiddenError:
+                metrics.inc("sends", status="forbidden")
+                logger.info(f"Пользователь {user_id} заблокировал бота, удаляем из подписчиков.")
+                await remove_subscriber(user_id)
+                self.discard(user_id)
+                return "failed"
+            except (exceptions.TelegramBadRequest, exceptions.TelegramNotFound, exceptions.TelegramEntityTooLarge) as e:
+                metrics.inc("sends", status="failed")
+                logger.warning(f"Telegram отклонил сообщение пользователю {user_id}: {e}")
+                return "failed"
+            except exceptions.TelegramAPIError as e:
+                metrics.inc("sends", status="retry")
+                logger.warning(f"Не удалось отправить сообщение пользователю {user_id}, повторим позже: {e}")
+                return "retry"
+        metrics.inc("sends", status="retry")
+        return "retry"
+
+broadcaster = Broadcaster()
+
+def format_job(job: Dict) -> str:
+    return (
         f"<b>{job['title']}</b>\n\n"
         f"{job['description'][:2000]}\n\n"
         f"Дата публикации вакансии: {job['date']}\n"
         f"Источник: <i>{job['source']}</i>\n"
         f"<a href=\"{job['link']}\">Ссылка</a>"
     )
-    subs = await get_subscribers()
-    for uid in subs:
+
+def format_search_result(job: Dict) -> str:
+    snippet = html.escape(job["snippet"]).replace("\x02", "<b>").replace("\x03", "</b>")
+    return (
+        f"<b>{html.escape(job['title'])}</b> — <i>{job['source']}</i>, {job['date']}\n"
+        f"{snippet}\n"
+        f"<a href=\"{job['link']}\">Ссылка</a>"
+    )
+
+def format_latest(job: Dict) -> str:
+    return (f"<b>{html.escape(job['title'])}</b> — <i>{job['source']}</i>, {format_posted(job['posted'])}\n"
+            f"<a href=\"{job['link']}\">Ссылка</a>")
+
+def next_digest_due(mode: str, now: int) -> int:
+    local = datetime.fromtimestamp(now, SOURCE_TZ)
+    if mode == "hourly":
+        due = local.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    else:
+        due = local.replace(hour=DIGEST_HOUR, minute=0, second=0, microsecond=0)
+        if due <= local:
+            due += timedelta(days=1)
+    return int(due.timestamp())
+
+def format_digest_item(job: Dict) -> str:
+    date = job["date"] or format_posted(job["posted"])
+    return f"• <a href=\"{job['link']}\">{html.escape(job['title'][:150])}</a> — <i>{job['source']}</i>, {date}"
+
+def split_digest(header: str, items: List[str]) -> List[Tuple[str, int]]:
+    # (текст, сколько вакансий в нём) — длина считается по HTML, Telegram считает без тегов, так что запас есть
+    messages: List[Tuple[str, int]] = []
+    lines, size, count = [header], len(header), 0
+    for item in items:
+        if count and size + 1 + len(item) > TELEGRAM_MESSAGE_LIMIT:
+            messages.append(("\n".join(lines), count))
+            lines, size, count = [], -1, 0
+        lines.append(item)
+        size += 1 + len(item)
+        count += 1
+    if count:
+        messages.append(("\n".join(lines), count))
+    return messages
+
+def delivery_result(rowid: int, status: str, attempts: int, waiting: str = "pending") -> Tuple[str, str, int, int]:
+    retry_at = 0
+    if status == "retry":
+        if attempts + 1 >= DELIVERY_MAX_ATTEMPTS:
+            status = "failed"
+        else:
+            status = waiting
+            retry_at = int(time.time()) + min(DELIVERY_RETRY_DELAY * 2 ** attempts, DELIVERY_MAX_RETRY_DELAY)
+    return status, datetime.now(timezone.utc).isoformat(), retry_at, rowid
+
+class DeliveryService:
+    def __init__(self, broadcaster: Broadcaster):
+        self.broadcaster = broadcaster
+        self._wakeup = asyncio.Event()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=DELIVERY_WORKERS * 4)
+        self._results: List[Tuple[str, str, int, int]] = []
+        # пока результаты сохраняются, их строки ещё 'pending': run() не должен начинать новый проход раньше
+        self._flush_lock = asyncio.Lock()
+        self._cursor = (0, 0)
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            _, rowid, user_id, attempts, payload = await self._queue.get()
+            try:
+                if user_id not in self.broadcaster.subscribers:
+                    status = "dropped"
+                else:
+                    status = await self.broadcaster.send(user_id, format_job(json.loads(payload)))
+            except Exception as e:
+                logger.error(f"Ошибка доставки пользователю {user_id}: {e}")
+                status = "retry"
+            self._results.append(delivery_result(rowid, status, attempts))
+            self._queue.task_done()
+
+    async def _flush(self):
+        async with self._flush_lock:
+            if self._results:
+                results, self._results = self._results, []
+                await save_delivery_results(results)
+
+    async def _flusher(self):
+        while True:
+            await asyncio.sleep(DELIVERY_FLUSH_INTERVAL)
+            await self._flush()
+
+    async def _send_digest(self, user_id: int, mode: str):
+        rows = await claim_digest(user_id)
+        results = []
+        retry = False
+        if rows and user_id not in self.broadcaster.subscribers:
+            results = [delivery_result(rowid, "dropped", attempts) for rowid, attempts, _ in rows]
+        elif rows:
+            items = [format_digest_item(json.loads(payload)) for _, _, payload in rows]
+            offset = 0
+            for text, count in split_digest(f"<b>Новые вакансии ({len(rows)}):</b>", items):
+                status = await self.broadcaster.send(user_id, text)
+                retry = retry or status == "retry"
+                results.extend(delivery_result(rowid, status, attempts, waiting="digest")
+                               for rowid, attempts, _ in rows[offset:offset + count])
+                offset += count
+            metrics.inc("digests", mode=mode)
+        if results:
+            await save_delivery_results(results)
+        now = int(time.time())
+        # неотправленная из-за сбоя часть дайджеста уходит повторно, не дожидаясь следующего слота
+        await schedule_digest(user_id, now + DELIVERY_RETRY_DELAY if retry else next_digest_due(mode, now))
+
+    async def _digests(self):
+        semaphore = asyncio.Semaphore(DELIVERY_WORKERS)
+
+        async def send(user_id: int, mode: str):
+            async with semaphore:
+                try:
+                    await self._send_digest(user_id, mode)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки дайджеста пользователю {user_id}: {e}")
+
+        while True:
+            due = await due_digests(int(time.time()))
+            await asyncio.gather(*(send(user_id, mode) for user_id, mode in due))
+            await asyncio.sleep(DIGEST_CHECK_INTERVAL)
+
+    async def run(self):
+        tasks = [asyncio.create_task(self._worker()) for _ in range(DELIVERY_WORKERS)]
+        tasks.append(asyncio.create_task(self._flusher()))
+        tasks.append(asyncio.create_task(self._digests()))
         try:
-            await bot.send_message(uid, text, disable_web_page_preview=True)
-        except exceptions.TelegramAPIError as e:
-            logger.warning(f"Не удалось отправить сообщение пользователю {uid}: {e}")
+            while True:
+                # сбрасываем до выборки: notify() во время join()/flush() не должен потеряться
+                self._wakeup.clear()
+                batch = await claim_deliveries(self._cursor, DELIVERY_BATCH)
+                if not batch:
+                    await self._queue.join()
+                    await self._flush()
+                    self._cursor = (0, 0)
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), DELIVERY_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                for item in batch:
+                    await self._queue.put(item)
+                self._cursor = batch[-1][:2]
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self._flush()
+
+delivery = DeliveryService(broadcaster)
 
 # ================= ЦИКЛ =================
-PARSERS: List[Type] = [
+PARSERS: List[Type[BaseParser]] = [
     WorkUA,
     RobotaUA,
     OlxUA,
@@ -638,60 +2304,493 @@ PARSERS: List[Type] = [
     Djinni
 ]
 
-async def scrape_loop():
-    await init_db()
-    while True:
-        logger.info("Начало нового цикла поиска вакансий...")
-        for parser_cls in PARSERS:
-            parser = parser_cls()
-            try:
-                jobs = await parser.run()
-            except Exception as e:
-                logger.error(f"Ошибка при работе {parser.name}: {e}")
+class SourceSchedule:
+    def __init__(self, parser_cls: Type[BaseParser]):
+        self.parser_cls = parser_cls
+        self.name = parser_cls.name
+        self.interval = FETCH_INTERVAL
+        self.next_run = 0.0
+        self.failures = 0
+        self.rate = 0.0
+        self.running = False
+
+class Scheduler:
+    def __init__(self, parsers: List[Type[BaseParser]]):
+        self.sources = [SourceSchedule(parser_cls) for parser_cls in parsers]
+        self._runs: deque = deque()
+
+    def _budget_left(self, now: float) -> bool:
+        while self._runs and now - self._runs[0] >= 3600:
+            self._runs.popleft()
+        return len(self._runs) < CRAWL_BUDGET_PER_HOUR
+
+    def take_due(self, now: float) -> List[SourceSchedule]:
+        due = []
+        for state in sorted(self.sources, key=lambda st: st.next_run):
+            if state.running or state.next_run > now:
                 continue
-            new_jobs_count = 0
-
-            for job in jobs:
-                if not await job_seen(job["source"], job["description"], job["title"]):
-                    await send_job(job)
-                    new_jobs_count += 1
-                    await asyncio.sleep(0.5)
+            breaker = get_breaker(state.name)
+            if not breaker.allow():
+                state.next_run = now + breaker.retry_in(now)
+                continue
+            if not self._budget_left(now):
+                logger.warning("Исчерпан бюджет запусков парсеров на час, откладываем.")
+                break
+            self._runs.append(now)
+            state.running = True
+            due.append(state)
+        return due
+
+    def seconds_until_next(self, now: float) -> float:
+        waiting = [state.next_run for state in self.sources if not state.running]
+        if self._runs and len(self._runs) >= CRAWL_BUDGET_PER_HOUR:
+            waiting = [max(t, self._runs[0] + 3600) for t in waiting]
+        return max(min(waiting, default=MAX_FETCH_INTERVAL) - now, 1.0)
+
+    def reschedule(self, state: SourceSchedule, ok: bool, rate: Optional[float], now: float):
+        state.running = False
+        state.rate = rate or 0.0
+        state.failures = 0 if ok else state.failures + 1
+        if rate is None:
+            interval = FETCH_INTERVAL
+        else:
+            interval = TARGET_NEW_PER_FETCH * 3600 / rate if rate > 0 else MAX_FETCH_INTERVAL
+        interval = min(max(interval, MIN_FETCH_INTERVAL), MAX_FETCH_INTERVAL)
+        if state.failures:
+            interval = min(interval * 2 ** state.failures, MAX_FETCH_INTERVAL)
+        state.interval = interval
+        state.next_run = now + interval
+        rate_text = f"{rate:.1f} новых вакансий/ч" if rate is not None else "темп ещё не известен"
+        logger.info(f"{state.name}: {rate_text}, следующий запуск через {interval / 60:.0f} мин.")
+
+scheduler = Scheduler(PARSERS)
+
+async def produce_jobs(parser: BaseParser, queue: asyncio.Queue):
+    stream = parser.stream()
+    try:
+        async for job in stream:
+            await queue.put(job)
+    finally:
+        await stream.aclose()
 
-            logger.info(f"Всего вакансий: {len(jobs)}, новых отправлено: {new_jobs_count}")
+async def scrape_source(parser: BaseParser, semaphore: asyncio.Semaphore, queue: asyncio.Queue) -> bool:
+    async with semaphore:
+        try:
+            await asyncio.wait_for(produce_jobs(parser, queue), parser.time_budget)
+        except asyncio.TimeoutError:
+            metrics.inc("timeouts", source=parser.name, stage="source_budget")
+            logger.warning(f"{parser.name}: превышен лимит времени {parser.time_budget} с, "
+                           f"обрабатываем собранные вакансии ({len(parser.jobs)})")
+        except Exception as e:
+            logger.error(f"Ошибка при работе {parser.name}: {e}")
+            return False
+        return parser.listing_found
+
+async def enqueue_stream(name: str, queue: asyncio.Queue) -> int:
+    new_count = 0
+    finished = False
+    while not finished:
+        batch = [await queue.get()]
+        while len(batch) < PIPELINE_BATCH and not queue.empty():
+            batch.append(queue.get_nowait())
+        if batch[-1] is None:
+            batch.pop()
+            finished = True
+        if not batch:
+            continue
+        try:
+            with metrics.timer("enqueue", name):
+                new_jobs = await enqueue_new_jobs(batch)
+        except Exception as e:
+            logger.error(f"{name}: ошибка при сохранении вакансий: {e}")
+            continue
+        if new_jobs:
+            notify_delivery()
+        new_count += len(new_jobs)
+    return new_count
+
+async def process_source(parser: BaseParser, semaphore: asyncio.Semaphore) -> bool:
+    started = asyncio.get_running_loop().time()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    consumer = asyncio.create_task(enqueue_stream(parser.name, queue))
+    try:
+        ok = await scrape_source(parser, semaphore, queue)
+        await queue.put(None)
+        new_count = await consumer
+    finally:
+        consumer.cancel()
+    jobs = parser.jobs
+    await save_http_cache(parser.http_cache_updates)
+    metrics.observe("cycle", parser.name, asyncio.get_running_loop().time() - started)
+    metrics.inc("jobs", len(jobs), source=parser.name)
+    metrics.inc("new_jobs", new_count, source=parser.name)
+
+    logger.info(f"{parser.name}: всего вакансий: {len(jobs)}, новых в очереди на отправку: {new_count}, "
+                f"за {asyncio.get_running_loop().time() - started:.1f} с")
+    blocked = parser.pool.take_blocked_stats(parser.name)
+    if blocked["requests"]:
+        logger.info(f"{parser.name}: заблокировано запросов: {blocked['requests']}, "
+                    f"сэкономлено ~{blocked['bytes'] / 1024 / 1024:.1f} МБ")
+    if parser.http:
+        http_stats = parser.http.take_stats(parser.name)
+        if http_stats["pages"]:
+            logger.info(f"{parser.name}: HTTP-страниц списка: {http_stats['pages']}, не изменились: "
+                        f"{http_stats['not_modified']} (304) + {http_stats['same_hash']} (тот же хеш), "
+                        f"сэкономлено {http_stats['bytes_saved'] / 1024:.0f} КБ")
+    return ok
+
+async def run_scheduled(state: SourceSchedule, pool: BrowserPool, http: HttpClient, semaphore: asyncio.Semaphore):
+    ok = False
+    try:
+        if shard_events is not None:
+            await subscriber_filters.load()
+        ok = await process_source(state.parser_cls(pool, http), semaphore)
+    finally:
+        try:
+            rate = await new_jobs_per_hour(state.name)
+        except Exception as e:
+            # без reschedule источник остался бы помеченным как running и больше не запускался бы
+            logger.error(f"{state.name}: не удалось посчитать темп новых вакансий: {e}")
+            rate = None
+        scheduler.reschedule(state, ok, rate, asyncio.get_running_loop().time())
+        report_schedule(state)
+
+async def maintenance_loop():
+    while True:
+        try:
+            removed = await prune_old_jobs()
+            if removed:
+                logger.info(f"Удалено вакансий старше {RETENTION_DAYS} дн.: {removed}")
+        except Exception as e:
+            logger.error(f"Ошибка очистки базы: {e}")
+        await asyncio.sleep(PRUNE_INTERVAL)
 
-        await asyncio.sleep(FETCH_INTERVAL)
+async def scrape_loop():
+    await init_db()
+    pool = BrowserPool()
+    await pool.start()
+    http = HttpClient()
+    await http.start()
+    semaphore = asyncio.Semaphore(SOURCE_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    try:
+        while True:
+            due = scheduler.take_due(loop.time())
+            if due:
+                await pool.health_check()
+                logger.info(f"Запуск парсеров: {', '.join(state.name for state in due)}")
+            for state in due:
+                tasks.add(asyncio.create_task(run_scheduled(state, pool, http, semaphore), name=state.name))
+
+            timeout = scheduler.seconds_until_next(loop.time())
+            if tasks:
+                done, tasks = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception():
+                        logger.error(f"{task.get_name()}: запуск завершился ошибкой: {task.exception()!r}")
+            else:
+                await asyncio.sleep(timeout)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await http.close()
+        await pool.close()
+
+# ================= ПРОЦЕССЫ СБОРА =================
+shard_events: Optional[Connection] = None
+shard_schedule: Dict[str, str] = {}
+
+def describe_schedule(state: SourceSchedule, now: float) -> str:
+    return (f"{state.name}: каждые {state.interval / 60:.0f} мин., {state.rate:.1f} новых/ч, "
+            f"{get_breaker(state.name).describe(now)}")
+
+def notify_delivery():
+    if shard_events is not None:
+        shard_events.send(("new_jobs",))
+    else:
+        delivery.notify()
+
+def report_schedule(state: SourceSchedule):
+    if shard_events is not None:
+        shard_events.send(("schedule", state.name, describe_schedule(state, asyncio.get_running_loop().time())))
+
+def shard_sources(shards: int) -> List[List[str]]:
+    groups: List[List[str]] = [[] for _ in range(min(shards, len(PARSERS)))]
+    for i, parser_cls in enumerate(PARSERS):
+        groups[i % len(groups)].append(parser_cls.name)
+    return groups
+
+async def shard_main(index: int, sources: List[str]):
+    logger.info(f"Процесс сбора {index}: {', '.join(sources)}")
+    await init_db()
+    await snapshots.open()
+    metrics_runner = await start_metrics_server()
+    try:
+        await scrape_loop()
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await snapshots.close()
+        await close_db()
+
+def run_shard(index: int, sources: List[str], events: Connection):
+    global shard_events, scheduler, seen_filter_persist, METRICS_PORT
+    shard_events = events
+    seen_filter_persist = False
+    scheduler = Scheduler([parser_cls for parser_cls in PARSERS if parser_cls.name in sources])
+    if METRICS_PORT:
+        METRICS_PORT += index + 1
+    try:
+        asyncio.run(shard_main(index, sources))
+    except KeyboardInterrupt:
+        pass
+
+class ShardSupervisor:
+    def __init__(self, shards: int):
+        self.groups = shard_sources(shards)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._reader, self._writer = self._ctx.Pipe(duplex=False)
+        self.processes: Dict[int, multiprocessing.Process] = {}
+
+    def _spawn(self, index: int):
+        process = self._ctx.Process(target=run_shard, args=(index, self.groups[index], self._writer),
+                                    name=f"crawler-{index}", daemon=True)
+        process.start()
+        self.processes[index] = process
+
+    def _receive(self):
+        while self._reader.poll():
+            event = self._reader.recv()
+            if event[0] == "new_jobs":
+                delivery.notify()
+            elif event[0] == "schedule":
+                shard_schedule[event[1]] = event[2]
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self._reader.fileno(), self._receive)
+        for index in range(len(self.groups)):
+            self._spawn(index)
+        logger.info(f"Сбор вакансий в {len(self.groups)} процессах: "
+                    f"{'; '.join(', '.join(group) for group in self.groups)}")
+        try:
+            while True:
+                await asyncio.sleep(SHARD_CHECK_INTERVAL)
+                for index, process in self.processes.items():
+                    if not process.is_alive():
+                        logger.error(f"Процесс сбора {index} завершился (код {process.exitcode}), перезапускаем.")
+                        self._spawn(index)
+        finally:
+            loop.remove_reader(self._reader.fileno())
+            for process in self.processes.values():
+                process.terminate()
+            for process in self.processes.values():
+                process.join(5)
 
 # ================= КОМАНДЫ БОТА =================
+search_sessions: Dict[int, Tuple[str, int]] = {}
+
+async def answer_search(message: Message, query: str, offset: int):
+    jobs, total = await search_jobs(query, offset, SEARCH_PAGE_SIZE + 1)
+    if not jobs:
+        search_sessions.pop(message.from_user.id, None)
+        await message.answer("Ничего не найдено." if offset == 0 else "Больше результатов нет.")
+        return
+    has_more = len(jobs) > SEARCH_PAGE_SIZE
+    jobs = jobs[:SEARCH_PAGE_SIZE]
+    if has_more:
+        search_sessions[message.from_user.id] = (query, offset + SEARCH_PAGE_SIZE)
+    else:
+        search_sessions.pop(message.from_user.id, None)
+    text = "\n\n".join(format_search_result(job) for job in jobs)
+    if offset == 0 and total > SEARCH_CANDIDATES:
+        text = (f"Совпадений: {total}, по релевантности отсортированы {SEARCH_CANDIDATES} самых свежих. "
+                f"Уточните запрос, чтобы найти более старые вакансии.\n\n{text}")
+    if has_more:
+        text += "\n\nЕщё результаты: /more"
+    await message.answer(text, disable_web_page_preview=True)
+
 @router.message(Command("start", "help"))
 async def cmd_start(message: Message):
-    await init_db()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("INSERT OR IGNORE INTO subscribers (user_id) VALUES (?)", (message.from_user.id,))
-        await db.commit()
+    await add_subscriber(message.from_user.id)
+    broadcaster.add(message.from_user.id)
     await message.answer("Привет! Я присылаю новые IT-вакансии.\n"
-                         "Команды: /stop — отписка, /status — статус.")
+                         "Команды: /stop — отписка, /status — статус, "
+                         "/search <запрос> — поиск по собранным вакансиям, "
+                         "/latest [N] — последние вакансии, /since <когда> — вакансии с указанного времени, "
+                         "/filter — фильтры рассылки, /digest — вакансии пачкой раз в час или в день.")
 
 @router.message(Command("stop"))
 async def cmd_stop(message: Message):
-    await init_db()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM subscribers WHERE user_id = ?", (message.from_user.id,))
-        await db.commit()
+    await remove_subscriber(message.from_user.id)
+    broadcaster.discard(message.from_user.id)
     await message.answer("Вы отписались.")
 
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject):
+    query = (command.args or "").strip()
+    if not fts_query(query):
+        await message.answer("Использование: /search <запрос>, например /search python django")
+        return
+    await answer_search(message, query, 0)
+
+@router.message(Command("more"))
+async def cmd_more(message: Message):
+    session = search_sessions.get(message.from_user.id)
+    if not session:
+        await message.answer("Сначала выполните поиск: /search <запрос>")
+        return
+    await answer_search(message, *session)
+
+@router.message(Command("latest"))
+async def cmd_latest(message: Message, command: CommandObject):
+    arg = (command.args or "").strip()
+    if arg and not arg.isdigit():
+        await message.answer(f"Использование: /latest [N], N не больше {LATEST_MAX}")
+        return
+    jobs = await latest_jobs(min(int(arg or SEARCH_PAGE_SIZE), LATEST_MAX) or 1)
+    if not jobs:
+        await message.answer("Вакансий пока нет.")
+        return
+    await message.answer("\n\n".join(format_latest(job) for job in jobs), disable_web_page_preview=True)
+
+@router.message(Command("since"))
+async def cmd_since(message: Message, command: CommandObject):
+    since = parse_posted((command.args or "").strip())
+    if not since:
+        await message.answer("Использование: /since вчера | 3 часа | 2 дня | 01.03.2025")
+        return
+    total = await count_jobs_since(since)
+    if not total:
+        await message.answer(f"С {format_posted(since)} новых вакансий нет.")
+        return
+    jobs = await latest_jobs(LATEST_MAX, since)
+    header = f"С {format_posted(since)}: {total} вакансий"
+    if total > len(jobs):
+        header += f", показаны последние {len(jobs)}"
+    text = "\n\n".join(format_latest(job) for job in jobs)
+    await message.answer(f"{header}\n\n{text}", disable_web_page_preview=True)
+
+DIGEST_TITLES = {"instant": "сразу по одной", "hourly": "раз в час", "daily": f"раз в день в {DIGEST_HOUR}:00"}
+DIGEST_HELP = (
+    "/digest instant — присылать каждую вакансию сразу\n"
+    "/digest hourly — одним сообщением раз в час\n"
+    f"/digest daily — одним сообщением раз в день в {DIGEST_HOUR}:00 по Киеву"
+)
+
+@router.message(Command("digest"))
+async def cmd_digest(message: Message, command: CommandObject):
+    user_id = message.from_user.id
+    mode = (command.args or "").strip().lower()
+    current = await get_digest(user_id)
+    if current is None:
+        await message.answer("Сначала подпишитесь: /start")
+        return
+    if not mode:
+        await message.answer(f"Сейчас вакансии приходят {DIGEST_TITLES[current]}.\n\n{DIGEST_HELP}")
+        return
+    if mode not in DIGEST_MODES:
+        await message.answer(DIGEST_HELP)
+        return
+    now = int(time.time())
+    await set_digest(user_id, mode, 0 if mode == "instant" else next_digest_due(mode, now))
+    if mode == "instant":
+        delivery.notify()
+    await message.answer(f"Готово: вакансии будут приходить {DIGEST_TITLES[mode]}.")
+
+FILTER_HELP = (
+    "/filter include python, django — присылать только вакансии с одним из этих слов\n"
+    "/filter exclude php, 1c — не присылать вакансии с этими словами\n"
+    "/filter source dou.ua, djinni.co — только эти источники\n"
+    "/filter since 01.03.2025 — только опубликованные не раньше даты\n"
+    "/filter clear [include|exclude|source|since] — сбросить фильтры"
+)
+
+def describe_filters(user_rules: Dict[str, Set[str]]) -> str:
+    titles = {"include": "Искать", "exclude": "Исключить", "source": "Источники", "since": "Не раньше"}
+    lines = [f"{titles[kind]}: {', '.join(sorted(user_rules[kind]))}" for kind in FILTER_KINDS if user_rules.get(kind)]
+    return "\n".join(lines) if lines else "Фильтров нет — присылаются все вакансии."
+
+@router.message(Command("filter"))
+async def cmd_filter(message: Message, command: CommandObject):
+    user_id = message.from_user.id
+    kind, _, rest = (command.args or "").strip().partition(" ")
+    kind = kind.lower()
+    values = [normalize_text(value) for value in rest.split(",") if value.strip()]
+
+    if not kind:
+        await message.answer(f"{describe_filters(subscriber_filters.rules.get(user_id, {}))}\n\n{FILTER_HELP}")
+        return
+    if kind == "clear":
+        clear_kind = values[0] if values else None
+        if clear_kind and clear_kind not in FILTER_KINDS:
+            await message.answer(FILTER_HELP)
+            return
+        await subscriber_filters.clear(user_id, clear_kind)
+        await message.answer(describe_filters(subscriber_filters.rules.get(user_id, {})))
+        return
+    if kind not in FILTER_KINDS or not values:
+        await message.answer(FILTER_HELP)
+        return
+
+    if kind == "source":
+        known = {parser_cls.name for parser_cls in PARSERS}
+        unknown = [value for value in values if value not in known]
+        if unknown:
+            await message.answer(f"Неизвестные источники: {', '.join(unknown)}. Доступны: {', '.join(sorted(known))}")
+            return
+    if kind == "since":
+        values = values[:1]
+        since = parse_posted(values[0])
+        if not since:
+            await message.answer("Дата должна быть в формате ДД.ММ.ГГГГ, например 01.03.2025")
+            return
+        values = [format_posted(since)[:10]]
+
+    await subscriber_filters.add(user_id, kind, values)
+    await message.answer(describe_filters(subscriber_filters.rules[user_id]))
+
 @router.message(Command("status"))
 async def cmd_status(message: Message):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT COUNT(*) FROM seen_jobs")
-        seen_count = (await cur.fetchone())[0]
-    await message.answer(f"Вакансий в базе: {seen_count}\n"
-                         f"Интервал: {FETCH_INTERVAL // 60} мин.")
+    cur = await db.execute("SELECT COUNT(*) FROM seen_jobs")
+    seen_count = (await cur.fetchone())[0]
+    now = asyncio.get_running_loop().time()
+    if CRAWL_SHARDS:
+        schedule = "\n".join(shard_schedule.get(parser_cls.name, f"{parser_cls.name}: ещё не запускался")
+                             for parser_cls in PARSERS)
+    else:
+        schedule = "\n".join(describe_schedule(state, now) for state in scheduler.sources)
+    hit_rate = seen_filter.misses / seen_filter.checks if seen_filter.checks else 0
+    await message.answer(f"Вакансий в базе: {seen_count} (хранятся {RETENTION_DAYS} дн.)\n"
+                         f"Фильтр Блума: {len(seen_filter.bits) / 1024:.0f} КБ, "
+                         f"ложных срабатываний ~{seen_filter.false_positive_rate():.2%}, "
+                         f"без запроса к базе: {hit_rate:.0%} проверок\n"
+                         f"Расписание:\n{schedule}\n"
+                         f"Метрики с запуска:\n{html.escape(metrics.summary())}")
 
 # ================= MAIN =================
 async def main():
+    global seen_filter_persist
     await init_db()
-    asyncio.create_task(scrape_loop())
-    await dp.start_polling(bot, allowed_updates=["message"])
+    await broadcaster.load()
+    await subscriber_filters.load()
+    await snapshots.open()
+    metrics_runner = await start_metrics_server()
+    asyncio.create_task(delivery.run())
+    if CRAWL_SHARDS:
+        seen_filter_persist = False
+        asyncio.create_task(ShardSupervisor(CRAWL_SHARDS).run())
+    else:
+        asyncio.create_task(scrape_loop())
+    asyncio.create_task(maintenance_loop())
+    try:
+        await dp.start_polling(bot, allowed_updates=["message"])
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await snapshots.close()
+        await close_db()
 
 if __name__ == "__main__":
     try:
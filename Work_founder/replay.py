@@ -0,0 +1,64 @@
+import os
+import sys
+import asyncio
+import time
+from typing import Dict
+
+os.environ.setdefault("BOT_TOKEN", "0:replay")
+
+import main
+
+COLUMNS = ("списков", "карточек", "без даты", "пустых", "вакансий", "без опис.", "мс/стр")
+
+
+async def replay(path: str, source: str = None, limit: int = None):
+    store = main.SnapshotStore(path)
+    await store.open()
+    if not store.enabled:
+        print(f"Не удалось открыть снимки: {path}")
+        return
+
+    parsers = {cls.name: cls(pool=None) for cls in main.PARSERS if not source or cls.name == source}
+    stats: Dict[str, Dict[str, float]] = {
+        name: {"listings": 0, "cards": 0, "no_date": 0, "broken": 0, "details": 0, "empty": 0, "ms": 0.0}
+        for name in parsers
+    }
+    try:
+        async for snap_source, kind, url, fetched, html in store.iter_snapshots(source, limit):
+            parser = parsers.get(snap_source)
+            if not parser:
+                continue
+            st = stats[snap_source]
+            started = time.perf_counter()
+            if kind == "listing":
+                listing = parser.parse_listing_html(html, url)
+                st["listings"] += 1
+                if listing is None:
+                    st["broken"] += 1
+                    print(f"{snap_source}: карточки не найдены — {url} ({fetched})")
+                else:
+                    cards = listing[0]
+                    st["cards"] += len(cards)
+                    st["no_date"] += sum(1 for card in cards if not card["date"])
+            else:
+                job = parser.parse_detail_html(html, {"title": "", "link": url, "date": ""})
+                st["details"] += 1
+                if not job["description"]:
+                    st["empty"] += 1
+            st["ms"] += (time.perf_counter() - started) * 1000
+    finally:
+        await store.close()
+
+    print(f"{'источник':<12}" + "".join(f"{column:>11}" for column in COLUMNS))
+    for name, st in stats.items():
+        pages = st["listings"] + st["details"]
+        values = (st["listings"], st["cards"], st["no_date"], st["broken"], st["details"], st["empty"])
+        print(f"{name:<12}" + "".join(f"{value:>11}" for value in values)
+              + f"{st['ms'] / pages if pages else 0:>11.2f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    snapshot_path = args[0] if args else main.SNAPSHOT_PATH or "snapshots.db"
+    source_name = args[1] if len(args) > 1 else None
+    asyncio.run(replay(snapshot_path, source_name))